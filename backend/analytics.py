@@ -0,0 +1,112 @@
+from sqlalchemy import func, desc
+from models import db, Customer, ServiceProfessional, Service, ServiceRequest, ServiceRequestStats, ServiceStatusEnum
+from caching import cache
+import queries
+
+# Admin dashboard analytics computed with SQL aggregates over the
+# ServiceRequestStats rollup. The result is cached for ANALYTICS_TTL seconds
+# and refreshed in the background by the refresh_admin_analytics task every
+# ANALYTICS_REFRESH_INTERVAL seconds, so the endpoint rarely computes it inline.
+
+ANALYTICS_CACHE_KEY = 'admin_analytics'
+ANALYTICS_TTL = 120
+ANALYTICS_REFRESH_INTERVAL = 60
+# Statuses whose price counts as earned revenue
+REVENUE_STATUSES = (ServiceStatusEnum.COMPLETED, ServiceStatusEnum.CLOSED)
+
+def compute_admin_analytics():
+    count = func.sum(ServiceRequestStats.request_count)
+    revenue = func.sum(db.case(
+        (ServiceRequestStats.service_status.in_(REVENUE_STATUSES), ServiceRequestStats.total_price), else_=0.0))
+
+    by_status = {status.name: 0 for status in ServiceStatusEnum}
+    for status, status_count in db.session.query(ServiceRequestStats.service_status, count) \
+            .group_by(ServiceRequestStats.service_status):
+        by_status[status.name] = status_count
+
+    by_service = [{
+        "service_id": row.id,
+        "service_name": row.name,
+        "service_type": row.service_type.name,
+        "count": row.count,
+        "revenue": row.revenue
+    } for row in db.session.query(
+        Service.id, Service.name, Service.service_type, count.label('count'), revenue.label('revenue')
+    ).join(ServiceRequestStats, ServiceRequestStats.service_id == Service.id)
+     .group_by(Service.id, Service.name, Service.service_type)
+     .having(count > 0)
+     .order_by(desc('count'))]
+
+    by_service_type = {}
+    for service in by_service:
+        by_service_type[service["service_type"]] = by_service_type.get(service["service_type"], 0) + service["count"]
+
+    by_month = [{
+        "month": row.month,
+        "count": row.count,
+        "revenue": row.revenue
+    } for row in db.session.query(
+        ServiceRequestStats.month, count.label('count'), revenue.label('revenue')
+    ).group_by(ServiceRequestStats.month).having(count > 0).order_by(ServiceRequestStats.month)]
+
+    professional_counts = db.session.query(
+        func.count(ServiceProfessional.id),
+        func.sum(db.case((db.and_(ServiceProfessional.approved == False, ServiceProfessional.blocked == False), 1), else_=0)),
+        func.sum(db.case((ServiceProfessional.blocked == True, 1), else_=0))
+    ).one()
+
+    pending_professionals = [{
+        "id": professional.id,
+        "name": professional.name,
+        "email": professional.user.email,
+        "service_type": professional.service_type.name,
+        "experience": professional.experience,
+        "description": professional.description
+    } for professional in queries.professionals_with_user().filter(
+        ServiceProfessional.approved == False, ServiceProfessional.blocked == False
+    ).order_by(ServiceProfessional.id).limit(5)]
+
+    recent_requests = [{
+        "id": row.id,
+        "service_name": row.service_name,
+        "customer_name": row.customer_name,
+        "professional_name": row.professional_name,
+        "status": row.service_status.name,
+        "date_of_request": row.date_of_request
+    } for row in queries.all_service_requests_rows().order_by(None)
+        .order_by(desc(ServiceRequest.date_of_request)).limit(5)]
+
+    return {
+        "totals": {
+            "customers": db.session.query(func.count(Customer.id)).scalar(),
+            "professionals": professional_counts[0],
+            "services": db.session.query(func.count(Service.id)).scalar(),
+            "requests": sum(by_status.values())
+        },
+        "requests_by_status": by_status,
+        "requests_by_service": by_service,
+        "requests_by_service_type": by_service_type,
+        "requests_by_month": by_month,
+        "revenue": {
+            "total": sum(service["revenue"] or 0 for service in by_service),
+            "by_month": {month["month"]: month["revenue"] for month in by_month}
+        },
+        "approvals": {
+            "pending": professional_counts[1] or 0,
+            "blocked": professional_counts[2] or 0,
+            "pending_professionals": pending_professionals
+        },
+        "recent_requests": recent_requests
+    }
+
+def refresh_admin_analytics():
+    """Recompute the analytics and replace the cached copy."""
+    data = compute_admin_analytics()
+    cache.set(ANALYTICS_CACHE_KEY, data, timeout=ANALYTICS_TTL)
+    return data
+
+def get_admin_analytics():
+    data = cache.get(ANALYTICS_CACHE_KEY)
+    if data is None:
+        data = refresh_admin_analytics()
+    return data
@@ -1,18 +1,13 @@
 from flask import Flask
-from flask_security import Security
-from flask_restful import Api
-from flask_cors import CORS
-from flask_security.utils import hash_password
 from json import JSONEncoder
-from models import db, user_datastore, Admin, ServiceTypeEnum, ServiceStatusEnum, ServiceRequest, Service, Customer, ServiceProfessional
-from config import localdev
+from models import db, user_datastore, Admin, ServiceTypeEnum, ServiceStatusEnum
+from config import localdev, PROCESS_TYPE
+from database import init_database
 from caching import cache
+from cache_invalidation import register_cache_invalidation
+from stats import register_stats_maintenance
 # Import the celery_app and configure_celery function from celery_instance
 from celery_instance import celery_app, configure_celery
-import flask_excel as excel
-from celery.result import AsyncResult
-from celery.schedules import crontab
-
 # Define the JSON encoder directly in this file
 class CustomJSONEncoder(JSONEncoder):
     """Custom JSON encoder that can handle our Enum types."""
@@ -24,63 +19,89 @@ class CustomJSONEncoder(JSONEncoder):
         # Let the parent class handle anything else
         return super().default(obj)
 
-def create_app():
-    app = Flask(__name__)
+def configure_app(app, process_type):
+    """Config, database, cache and session hooks shared by the web and worker apps."""
     app.config.from_object(localdev)
     app.json_encoder = CustomJSONEncoder
-    db.init_app(app)
-    Security(app, user_datastore)
-    CORS(app)
-    api = Api(app)
+    init_database(app, process_type)
     cache.init_app(app)
+    register_cache_invalidation()
+    register_stats_maintenance()
     # Configure Celery with app context
     configure_celery(app)
-    return app, api
-
-app, api = create_app()
 
-# Make app accessible for celery tasks
-celery_app.flask_app = app
-
-# Import routes after app is created
-from routes import (
-    SignUp, SignIn, SignOut, CustomerDashboard, adminDashboard, 
-    adminService, adminCustomers, adminProfessional, CustomerServices, 
-    SearchServices, SearchProfessionals, ProfessionalsByServiceType,
-    ProfessionalServiceRequests, ProfessionalProfile, ServiceRequests, 
-    AllServiceRequests
-)
-
-# Now import tasks after app context is configured
-from tasks import daily_reminder, create_resource_csv, monthly_report_generator
-
-api.add_resource(SignUp, "/signup")
-api.add_resource(SignIn, "/signin")
-api.add_resource(SignOut, "/signout")
-api.add_resource(CustomerDashboard, "/customer/dashboard")
-api.add_resource(CustomerServices, "/customer/services", "/customer/services/<int:request_id>")
-api.add_resource(SearchServices, "/customer/search-services")
-api.add_resource(SearchProfessionals, "/admin/search-professionals")
-api.add_resource(ProfessionalsByServiceType, "/service/<int:service_id>/professionals") 
-api.add_resource(adminDashboard, "/admin/dashboard")
-api.add_resource(adminService, "/admin/service", "/admin/service/<int:service_id>")
-api.add_resource(adminCustomers, "/admin/customers", "/admin/customers/<int:customer_id>")
-api.add_resource(adminProfessional, "/admin/professionals", "/admin/professionals/<int:professional_id>")
-api.add_resource(ProfessionalServiceRequests, "/professional/requests", "/professional/requests/<int:request_id>")
-api.add_resource(ProfessionalProfile, "/professional/profile")
-api.add_resource(ServiceRequests, "/admin/service/<int:service_id>/requests")
-api.add_resource(AllServiceRequests, "/admin/service-requests")
-
-from celery_endpoints import DownloadCSV, GetCSV
-api.add_resource(DownloadCSV, "/downloadcsv")
-api.add_resource(GetCSV, "/getcsv/<task_id>")
+def register_resources(api):
+    # Imported here so the web stack only loads when a web app is built
+    from routes import (
+        SignUp, SignIn, SignOut, CustomerDashboard, adminDashboard, AdminAnalytics,
+        adminService, adminCustomers, adminProfessional, CustomerServices, 
+        SearchServices, SearchProfessionals, ProfessionalsByServiceType,
+        ProfessionalServiceRequests, ProfessionalProfile, ServiceRequests, 
+        AllServiceRequests, Readiness, adminServiceBulk, adminCustomersBulk, adminProfessionalBulk
+    )
+    from celery_endpoints import DownloadCSV, GetCSV, ImportUpload, ImportStatus
+
+    api.add_resource(SignUp, "/signup")
+    api.add_resource(SignIn, "/signin")
+    api.add_resource(SignOut, "/signout")
+    api.add_resource(CustomerDashboard, "/customer/dashboard")
+    api.add_resource(CustomerServices, "/customer/services", "/customer/services/<int:request_id>")
+    api.add_resource(SearchServices, "/customer/search-services")
+    api.add_resource(SearchProfessionals, "/admin/search-professionals")
+    api.add_resource(ProfessionalsByServiceType, "/service/<int:service_id>/professionals") 
+    api.add_resource(adminDashboard, "/admin/dashboard")
+    api.add_resource(AdminAnalytics, "/admin/analytics")
+    api.add_resource(adminService, "/admin/service", "/admin/service/<int:service_id>")
+    api.add_resource(adminCustomers, "/admin/customers", "/admin/customers/<int:customer_id>")
+    api.add_resource(adminProfessional, "/admin/professionals", "/admin/professionals/<int:professional_id>")
+    api.add_resource(adminServiceBulk, "/admin/service/bulk")
+    api.add_resource(adminCustomersBulk, "/admin/customers/bulk")
+    api.add_resource(adminProfessionalBulk, "/admin/professionals/bulk")
+    api.add_resource(ProfessionalServiceRequests, "/professional/requests", "/professional/requests/<int:request_id>")
+    api.add_resource(ProfessionalProfile, "/professional/profile")
+    api.add_resource(ServiceRequests, "/admin/service/<int:service_id>/requests")
+    api.add_resource(AllServiceRequests, "/admin/service-requests")
+    api.add_resource(Readiness, "/ready")
+    api.add_resource(DownloadCSV, "/downloadcsv")
+    api.add_resource(GetCSV, "/getcsv/<task_id>")
+    api.add_resource(ImportUpload, "/admin/import/<string:kind>")
+    api.add_resource(ImportStatus, "/admin/import/status/<task_id>")
 
-@app.route('/')
 def home():
     return {"msg": "Hello!"}
 
-def create_admin():
+def create_app(process_type=PROCESS_TYPE):
+    from flask_security import Security
+    from flask_restful import Api
+    from flask_cors import CORS
+    from principal import register_principal_loader
+
+    app = Flask(__name__)
+    configure_app(app, process_type)
+    Security(app, user_datastore)
+    register_principal_loader(app)
+    CORS(app)
+    api = Api(app)
+    register_resources(api)
+    app.add_url_rule('/', view_func=home)
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `from app import app` builds the web app on first use, so importing
+    # this module for create_app or celery_app stays cheap
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_admin(app):
     """Creates an admin role and user if they don't exist."""
+    from flask_security.utils import hash_password
+
     with app.app_context():
         # Ensure the "admin" role exists
         if not user_datastore.find_role("admin"):
@@ -100,21 +121,8 @@ def create_admin():
         db.session.commit()
 
 
-@celery_app.on_after_configure.connect
-def setup_periodic_tasks(sender, **kwargs):
-    sender.add_periodic_task(
-        crontab(hour=0, minute=49, day_of_week='*'),
-        daily_reminder.s(),
-    )
-    
-    sender.add_periodic_task(
-        crontab(hour=0, minute=49),
-        monthly_report_generator.s(),
-    )
-
-
-
 if __name__ == '__main__':
-    create_admin()  # Ensure admin exists before starting the app
+    app = create_app()
+    create_admin(app)  # Ensure admin exists before starting the app
     app.run(debug=True)
 
@@ -0,0 +1,241 @@
+import argparse
+import heapq
+import time
+from collections import defaultdict
+from sqlalchemy import bindparam
+from models import db, User, Customer, Service, ServiceProfessional, ServiceRequest, ServiceStatusEnum
+from caching import tag_versions, PROFESSIONALS_TAG, SERVICE_REQUESTS_TAG
+from cache_invalidation import add_cache_tags, user_cache_tags
+from proximity import PINCODE_LENGTH, MIN_PREFIX_LENGTH
+from stats import pending_counts_by_professional, record_bulk_changes, TRACKED_COLUMNS
+
+# Assigns requests created without a professional to an approved, unblocked
+# professional of the service's type.
+# Each worker keeps a min-heap of (pending load, professional id) for every
+# (service type, pincode prefix) pair plus one per service type. Every claim
+# bumps the professional's load and pushes a fresh heap entry, and outdated
+# entries are dropped lazily when they reach the top. When requests change
+# anywhere (completions, cancellations, direct bookings, other workers' claims)
+# the loads are re-read from the rollup; when professionals change the engine
+# diffs the available professionals against what it holds and only adds,
+# moves or removes those that differ. A request looks at the least loaded
+# professional in each ring around the customer's pincode and takes the one
+# with the lowest load + AFFINITY_WEIGHT * distance.
+# Rows are claimed with a conditional UPDATE, so concurrent workers can never
+# assign the same request twice. Between refreshes loads only count this
+# worker's own claims.
+
+PENDING_STATUSES = (ServiceStatusEnum.REQUESTED, ServiceStatusEnum.ACCEPTED)
+# Pending requests a professional may carry over a closer one per pincode ring of distance
+AFFINITY_WEIGHT = 2
+# Requests assigned per transaction
+ASSIGNMENT_BATCH_SIZE = 1000
+# Minimum seconds between refreshes, so bursts of changes such as an import or
+# a busy stretch of bookings are applied together
+ASSIGNMENT_REFRESH_INTERVAL = 5
+
+_engine = None
+
+# Built once and reused so each claim skips statement compilation
+service_requests = ServiceRequest.__table__
+CLAIM_STATEMENT = service_requests.update().where(
+    service_requests.c.id == bindparam('request_id'),
+    service_requests.c.professional_id.is_(None),
+    service_requests.c.service_status == ServiceStatusEnum.REQUESTED.name
+).values(professional_id=bindparam('professional_id'))
+
+def heap_keys(service_type, pincode):
+    pincode = pincode or ''
+    return [(service_type, None)] + [
+        (service_type, pincode[:length]) for length in range(MIN_PREFIX_LENGTH, len(pincode) + 1)
+    ]
+
+class AssignmentEngine:
+    def __init__(self, versions, professionals, loads):
+        self.versions = versions
+        self.refreshed_at = time.monotonic()
+        self.load = {}
+        self.placement = {}
+        self.keys = {}
+        self.heaps = defaultdict(list)
+        for professional_id, service_type, pincode in professionals:
+            self.add(professional_id, service_type, pincode, loads.get(professional_id, 0))
+
+    def add(self, professional_id, service_type, pincode, load):
+        self.placement[professional_id] = (service_type, pincode)
+        self.keys[professional_id] = heap_keys(service_type, pincode)
+        self.load[professional_id] = load
+        for key in self.keys[professional_id]:
+            heapq.heappush(self.heaps[key], (load, professional_id))
+
+    def remove(self, professional_id):
+        # Its heap entries go stale and are dropped when they reach the top
+        del self.placement[professional_id], self.keys[professional_id], self.load[professional_id]
+
+    def refresh(self, versions, professionals, loads):
+        """
+        Apply changes in the set of available professionals, unless
+        professionals is None, and reset every load to the one in loads.
+        """
+        if professionals is not None:
+            current = {professional_id: (service_type, pincode)
+                       for professional_id, service_type, pincode in professionals}
+            for professional_id in [pid for pid in self.placement if pid not in current]:
+                self.remove(professional_id)
+            for professional_id, placement in current.items():
+                known = self.placement.get(professional_id)
+                if known != placement:
+                    if known is not None:
+                        # Moved or changed service type
+                        self.remove(professional_id)
+                    self.add(professional_id, *placement, loads.get(professional_id, 0))
+        for professional_id, load in self.load.items():
+            self.adjust(professional_id, loads.get(professional_id, 0) - load)
+        self.versions = versions
+        self.refreshed_at = time.monotonic()
+
+    def least_loaded(self, key):
+        """(load, professional_id) at the top of a heap, dropping stale entries."""
+        heap = self.heaps.get(key)
+        while heap:
+            load, professional_id = heap[0]
+            if self.load.get(professional_id) == load and key in self.keys[professional_id]:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def choose(self, service_type, pincode):
+        """Best professional id for a request, or None if nobody offers the service."""
+        pincode = (pincode or '').strip()
+        rings = [(pincode[:length], PINCODE_LENGTH - length)
+                 for length in range(min(len(pincode), PINCODE_LENGTH), MIN_PREFIX_LENGTH - 1, -1)]
+        rings.append((None, PINCODE_LENGTH))
+        best = None
+        for prefix, distance in rings:
+            top = self.least_loaded((service_type, prefix))
+            if top is not None:
+                score = (top[0] + AFFINITY_WEIGHT * distance, top[1])
+                if best is None or score < best:
+                    best = score
+        return best[1] if best else None
+
+    def assigned(self, professional_id):
+        self.adjust(professional_id, 1)
+
+    def adjust(self, professional_id, delta):
+        if professional_id not in self.load or not delta:
+            return
+        self.load[professional_id] += delta
+        entry = (self.load[professional_id], professional_id)
+        for key in self.keys[professional_id]:
+            heapq.heappush(self.heaps[key], entry)
+
+def available_professionals():
+    return db.session.query(
+        ServiceProfessional.id, ServiceProfessional.service_type, User.pincode
+    ).join(User, ServiceProfessional.user_id == User.id).filter(
+        ServiceProfessional.approved == True, ServiceProfessional.blocked == False
+    ).all()
+
+def pending_loads():
+    return dict(pending_counts_by_professional(PENDING_STATUSES).all())
+
+def get_engine():
+    """
+    This worker's engine, loaded on first use and refreshed when professionals
+    or requests change.
+    """
+    global _engine
+    # Read the versions before loading so a concurrent write triggers another refresh
+    versions = tuple(tag_versions([PROFESSIONALS_TAG, SERVICE_REQUESTS_TAG]))
+    engine = _engine
+    if engine is None:
+        engine = _engine = AssignmentEngine(versions, available_professionals(), pending_loads())
+    elif engine.versions != versions \
+            and time.monotonic() - engine.refreshed_at >= ASSIGNMENT_REFRESH_INTERVAL:
+        professionals = available_professionals() if engine.versions[0] != versions[0] else None
+        engine.refresh(versions, professionals, pending_loads())
+    return engine
+
+def unassigned_requests(request_ids=None, limit=ASSIGNMENT_BATCH_SIZE, after_id=0):
+    query = db.session.query(
+        *[getattr(ServiceRequest, attr) for attr in ('id',) + TRACKED_COLUMNS],
+        Service.service_type,
+        User.pincode
+    ).join(Service, ServiceRequest.service_id == Service.id) \
+     .join(Customer, ServiceRequest.customer_id == Customer.id) \
+     .join(User, Customer.user_id == User.id) \
+     .filter(ServiceRequest.professional_id.is_(None),
+             ServiceRequest.service_status == ServiceStatusEnum.REQUESTED,
+             ServiceRequest.id > after_id)
+    if request_ids is not None:
+        query = query.filter(ServiceRequest.id.in_(request_ids))
+    return query.order_by(ServiceRequest.id).limit(limit).all()
+
+def assign_pending_requests(request_ids=None, limit=ASSIGNMENT_BATCH_SIZE, after_id=0):
+    """
+    Assign up to limit unassigned requests with ids above after_id in one
+    transaction. Returns ([(request_id, professional_id)], last request id looked at).
+    """
+    engine = get_engine()
+    assignments = []
+    changes = []
+    last_id = None
+    connection = db.session.connection()
+    for row in unassigned_requests(request_ids, limit, after_id):
+        last_id = row.id
+        professional_id = engine.choose(row.service_type, row.pincode)
+        if professional_id is None:
+            continue
+        claimed = connection.execute(
+            CLAIM_STATEMENT, {'request_id': row.id, 'professional_id': professional_id}
+        ).rowcount
+        # Another worker got there first
+        if not claimed:
+            continue
+        engine.assigned(professional_id)
+        before = {attr: getattr(row, attr) for attr in TRACKED_COLUMNS}
+        changes.append((before, dict(before, professional_id=professional_id)))
+        assignments.append((row.id, professional_id))
+
+    if assignments:
+        # Bulk UPDATEs skip the flush hooks, so keep the rollup and caches in step here
+        record_bulk_changes(db.session, changes)
+        add_cache_tags(db.session, {SERVICE_REQUESTS_TAG} | user_cache_tags(
+            db.session,
+            customer_ids={before['customer_id'] for before, _ in changes},
+            professional_ids={professional_id for _, professional_id in assignments}
+        ))
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # The in-memory loads already count these assignments
+        for _, professional_id in assignments:
+            engine.adjust(professional_id, -1)
+        raise
+    return assignments, last_id
+
+def assign_all_pending(batch_size=ASSIGNMENT_BATCH_SIZE):
+    """Sweep every unassigned request in batches; returns the number assigned."""
+    total = 0
+    after_id = 0
+    while True:
+        assignments, after_id = assign_pending_requests(limit=batch_size, after_id=after_id)
+        total += len(assignments)
+        # Requests nobody can take yet are skipped rather than retried in a loop
+        if after_id is None:
+            return total
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Assign unassigned service requests to professionals.')
+    parser.add_argument('--limit', type=int, default=ASSIGNMENT_BATCH_SIZE, help='Requests per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        total = assign_all_pending(args.limit)
+        elapsed = time.perf_counter() - started
+        print(f"Assigned {total} requests in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f}/s)")
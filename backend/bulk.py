@@ -0,0 +1,129 @@
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from models import db, User, Customer, Service, ServiceProfessional, ServiceTypeEnum
+from caching import SERVICES_TAG, SERVICE_REQUESTS_TAG, PROFESSIONALS_TAG
+from cache_invalidation import add_cache_tags, add_principal_evictions, user_cache_tags
+
+# Set-based admin operations: each call looks up the rows it touches with one
+# SELECT, applies the change with one UPDATE or INSERT and commits once,
+# however many items it is given. The statements bypass the ORM flush hooks,
+# so the cache tags and principal evictions the hooks would have queued are
+# added here. Results are returned per input item, in input order.
+
+# Largest batch a single call accepts
+BULK_MAX_ITEMS = 5000
+
+def parse_ids(ids):
+    """Split a list of ids into (valid ids, per-position results for invalid ones)."""
+    valid = set()
+    invalid = {}
+    for position, value in enumerate(ids):
+        if isinstance(value, int) and not isinstance(value, bool):
+            valid.add(value)
+        else:
+            invalid[position] = {"id": value, "status": "invalid", "error": "Id must be an integer"}
+    return valid, invalid
+
+def id_results(ids, found, invalid):
+    return [invalid.get(position) or {"id": value, "status": "updated" if value in found else "not_found"}
+            for position, value in enumerate(ids)]
+
+def user_uniquifiers(user_ids):
+    return db.session.execute(select(User.fs_uniquifier).where(User.id.in_(user_ids))).scalars().all()
+
+def bulk_update_professionals(ids, values):
+    """Set approved and/or blocked on every professional in ids."""
+    valid, invalid = parse_ids(ids)
+    rows = db.session.execute(
+        select(ServiceProfessional.id, ServiceProfessional.user_id).where(ServiceProfessional.id.in_(valid))
+    ).all() if valid else []
+    found = {row.id for row in rows}
+
+    if found:
+        db.session.execute(
+            update(ServiceProfessional).where(ServiceProfessional.id.in_(found)).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        add_cache_tags(db.session, {PROFESSIONALS_TAG, SERVICE_REQUESTS_TAG}
+                       | user_cache_tags(db.session, professional_ids=found))
+        # The principal carries the professional's blocked flag
+        add_principal_evictions(db.session, user_uniquifiers({row.user_id for row in rows}))
+    db.session.commit()
+    return id_results(ids, found, invalid)
+
+def bulk_set_customers_active(ids, active):
+    """Activate or deactivate the user accounts of every customer in ids."""
+    valid, invalid = parse_ids(ids)
+    rows = db.session.execute(
+        select(Customer.id, Customer.user_id).where(Customer.id.in_(valid))
+    ).all() if valid else []
+    found = {row.id for row in rows}
+
+    if found:
+        user_ids = {row.user_id for row in rows}
+        db.session.execute(
+            update(User).where(User.id.in_(user_ids)).values(active=active),
+            execution_options={'synchronize_session': False}
+        )
+        add_cache_tags(db.session, {SERVICE_REQUESTS_TAG} | user_cache_tags(db.session, customer_ids=found))
+        add_principal_evictions(db.session, user_uniquifiers(user_ids))
+    db.session.commit()
+    return id_results(ids, found, invalid)
+
+def insert_returning_ids(model, rows):
+    """Insert rows with executemany; returns the new ids in the order of rows."""
+    if db.engine.dialect.name == 'sqlite':
+        # Ordered RETURNING makes SQLAlchemy insert row by row on SQLite. The
+        # multi-row INSERTs run one after another under the write lock, so
+        # ids come out ascending in input order and sorting is enough.
+        return sorted(db.session.execute(insert(model).returning(model.id), rows).scalars())
+    return db.session.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+
+def service_row(record, created_at):
+    """Column values for one service record, or an error message."""
+    if not isinstance(record, dict):
+        return None, "Service must be an object"
+    name = record.get('name')
+    price = record.get('price')
+    service_type_str = record.get('service_type')
+    if not name or not price or not service_type_str:
+        return None, "Name, price, and service type are mandatory"
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None, "Price must be a number"
+    try:
+        service_type = ServiceTypeEnum[str(service_type_str).upper()]
+    except KeyError:
+        return None, f"Invalid service type. Must be one of: {[e.name for e in ServiceTypeEnum]}"
+    return {
+        'name': name,
+        'price': price,
+        'description': record.get('description', ''),
+        'service_type': service_type,
+        'created_at': created_at
+    }, None
+
+def bulk_create_services(records):
+    """Insert every valid record with one executemany; invalid ones are reported, not inserted."""
+    created_at = datetime.utcnow()
+    results = []
+    rows = []
+    for position, record in enumerate(records):
+        row, error = service_row(record, created_at)
+        if error:
+            results.append({"index": position, "status": "invalid", "error": error})
+        else:
+            results.append({"index": position, "status": "created"})
+            rows.append(row)
+
+    if rows:
+        new_ids = iter(insert_returning_ids(Service, rows))
+        for result in results:
+            if result["status"] == "created":
+                result["id"] = next(new_ids)
+        add_cache_tags(db.session, {SERVICES_TAG, SERVICE_REQUESTS_TAG})
+    db.session.commit()
+    return results
@@ -0,0 +1,127 @@
+from itertools import chain
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import User, Customer, ServiceProfessional, ServiceRequest, Service, Admin
+from caching import (invalidate_tags, user_tag, CUSTOMER_DASHBOARD_CACHE,
+                     PROFESSIONAL_REQUESTS_CACHE, SERVICES_TAG, SERVICE_REQUESTS_TAG, PROFESSIONALS_TAG)
+from principal import evict_principals
+
+# Maps rows changed in a transaction to cache tags and invalidates them once
+# the transaction commits. Tags are gathered after each flush and dropped on
+# rollback, so nothing is evicted for work that never reached the database.
+
+def column_values(obj, attr):
+    """Current and pre-flush values of a column, ignoring None."""
+    history = inspect(obj).attrs[attr].history
+    values = {getattr(obj, attr)} | set(history.deleted)
+    values.discard(None)
+    return values
+
+def column_changed(obj, attr):
+    return inspect(obj).attrs[attr].history.has_changes()
+
+def collect_cache_tags(session):
+    tags = set()
+    customer_ids = set()
+    professional_ids = set()
+
+    dirty = [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in chain(session.new, dirty, session.deleted):
+        # Admin request lists show fields from every one of these models
+        if isinstance(obj, (ServiceRequest, Service, Customer, ServiceProfessional, User)):
+            tags.add(SERVICE_REQUESTS_TAG)
+        if isinstance(obj, ServiceRequest):
+            customer_ids |= column_values(obj, 'customer_id')
+            professional_ids |= column_values(obj, 'professional_id')
+        elif isinstance(obj, Service):
+            tags.add(SERVICES_TAG)
+        elif isinstance(obj, Customer):
+            customer_ids.add(obj.id)
+            # Professionals see customer names on their request lists
+            if column_changed(obj, 'name'):
+                professional_ids.update(session.execute(
+                    select(ServiceRequest.professional_id).where(ServiceRequest.customer_id == obj.id)
+                ).scalars())
+        elif isinstance(obj, ServiceProfessional):
+            tags.add(PROFESSIONALS_TAG)
+            professional_ids.add(obj.id)
+            # Customers see professional names in their service history
+            if column_changed(obj, 'name'):
+                customer_ids.update(session.execute(
+                    select(ServiceRequest.customer_id).where(ServiceRequest.professional_id == obj.id)
+                ).scalars())
+        elif isinstance(obj, User):
+            if column_changed(obj, 'pincode'):
+                tags.add(PROFESSIONALS_TAG)
+            tags.add(user_tag(CUSTOMER_DASHBOARD_CACHE, obj.id))
+            tags.add(user_tag(PROFESSIONAL_REQUESTS_CACHE, obj.id))
+
+    return tags | user_cache_tags(session, customer_ids, professional_ids)
+
+def user_cache_tags(session, customer_ids=(), professional_ids=()):
+    """Per-user view tags for the given customer and professional ids."""
+    tags = set()
+    customer_ids = set(customer_ids) - {None}
+    professional_ids = set(professional_ids) - {None}
+    if customer_ids:
+        tags.update(user_tag(CUSTOMER_DASHBOARD_CACHE, user_id) for user_id in session.execute(
+            select(Customer.user_id).where(Customer.id.in_(customer_ids))
+        ).scalars())
+    if professional_ids:
+        tags.update(user_tag(PROFESSIONAL_REQUESTS_CACHE, user_id) for user_id in session.execute(
+            select(ServiceProfessional.user_id).where(ServiceProfessional.id.in_(professional_ids))
+        ).scalars())
+    return tags
+
+def collect_principals(session):
+    """fs_uniquifiers of users whose account, roles or profiles changed."""
+    uniquifiers = set()
+    user_ids = set()
+    dirty = [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in chain(session.new, dirty, session.deleted):
+        if isinstance(obj, User):
+            uniquifiers |= column_values(obj, 'fs_uniquifier')
+        elif isinstance(obj, (Customer, ServiceProfessional, Admin)):
+            user_ids |= column_values(obj, 'user_id')
+    if user_ids:
+        uniquifiers.update(session.execute(
+            select(User.fs_uniquifier).where(User.id.in_(user_ids))
+        ).scalars())
+    return uniquifiers
+
+def add_cache_tags(session, tags):
+    """Invalidate tags when the session commits, e.g. after a bulk UPDATE."""
+    if tags:
+        session.info.setdefault('cache_tags', set()).update(tags)
+
+def add_principal_evictions(session, fs_uniquifiers):
+    """Drop cached principals when the session commits."""
+    if fs_uniquifiers:
+        session.info.setdefault('principals', set()).update(fs_uniquifiers)
+
+def after_flush(session, flush_context):
+    add_cache_tags(session, collect_cache_tags(session))
+    add_principal_evictions(session, collect_principals(session))
+
+def after_commit(session):
+    tags = session.info.pop('cache_tags', None)
+    principals = session.info.pop('principals', None)
+    try:
+        if tags:
+            invalidate_tags(*tags)
+        if principals:
+            evict_principals(principals)
+    except Exception as e:
+        # The data is already committed; a cache outage must not fail the request
+        print(f"Error invalidating cache tags {sorted(tags or ())}: {str(e)}")
+
+def after_rollback(session):
+    session.info.pop('cache_tags', None)
+    session.info.pop('principals', None)
+
+def register_cache_invalidation():
+    """Hook cache invalidation into every SQLAlchemy session."""
+    if not event.contains(Session, 'after_flush', after_flush):
+        event.listen(Session, 'after_flush', after_flush)
+        event.listen(Session, 'after_commit', after_commit)
+        event.listen(Session, 'after_rollback', after_rollback)
@@ -1,5 +1,115 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, make_response, Response
 from flask_caching import Cache
+from flask_security import current_user
 
 # Initialize cache object without binding it to an app yet
 # This will be bound to the app in app.py
-cache = Cache()
\ No newline at end of file
+cache = Cache()
+
+# Key prefixes of the per-user cached dashboards
+CUSTOMER_DASHBOARD_CACHE = 'CustomerDashboard.get'
+PROFESSIONAL_REQUESTS_CACHE = 'ProfessionalServiceRequests.get'
+
+# Shared tag for anything rendered from the service catalog
+SERVICES_TAG = 'services'
+# Shared tag for admin views listing service requests across all users
+SERVICE_REQUESTS_TAG = 'service_requests'
+# Shared tag for anything built from professionals and their pincodes
+PROFESSIONALS_TAG = 'professionals'
+
+def user_tag(key_prefix, user_id):
+    """Tag covering every cached response of a view for a single user."""
+    return f"{key_prefix}/user/{user_id}"
+
+def tag_version_key(tag):
+    return f"tag/{tag}/version"
+
+def version_seed():
+    # Versions restart from a timestamp when missing (e.g. after a Redis
+    # flush) so a version handed out before can never be reused
+    return int(time.time() * 1000)
+
+def tag_versions(tags):
+    """Current version of each tag, seeding any that are missing."""
+    versions = cache.get_many(*[tag_version_key(tag) for tag in tags])
+    return [
+        version if version is not None else cache.cache.inc(tag_version_key(tag), version_seed())
+        for tag, version in zip(tags, versions)
+    ]
+
+def cached_per_user(timeout=None, key_prefix='view', tags=()):
+    """Cache a view's response separately for each authenticated user.
+
+    The key combines the user id, the current version of the user's tag and
+    of any shared tags, and the query args. Invalidating a tag bumps its
+    version so only the entries built on it stop matching. Must be applied
+    below @auth_required so current_user is already resolved.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            entry_tags = [user_tag(key_prefix, current_user.id)] + list(tags)
+            versions = tag_versions(entry_tags)
+            params = urlencode(sorted(list(request.args.items(multi=True)) + list(kwargs.items())))
+            cache_key = f"{entry_tags[0]}/v{'.'.join(str(v) for v in versions)}?{params}"
+
+            cached = cache.get(cache_key)
+            if cached is not None:
+                body, status, mimetype = cached
+                return Response(body, status=status, mimetype=mimetype)
+
+            rv = make_response(f(*args, **kwargs))
+            if rv.status_code == 200:
+                cache.set(cache_key, (rv.get_data(), rv.status_code, rv.mimetype), timeout=timeout)
+            return rv
+        return decorated_function
+    return decorator
+
+def invalidate_tags(*tags):
+    """Invalidate every cached response built on any of the given tags."""
+    for tag in tags:
+        if cache.cache.inc(tag_version_key(tag)) == 1:
+            cache.cache.inc(tag_version_key(tag), version_seed())
+
+def evict_user_cache(key_prefix, user_id):
+    """Invalidate every cached response of a view for a single user."""
+    if user_id is None:
+        return
+    invalidate_tags(user_tag(key_prefix, user_id))
+
+def per_user_tags(key_prefix, tags=()):
+    """Tags of a cached_per_user view for the current user, for use with conditional."""
+    return lambda: [user_tag(key_prefix, current_user.id)] + list(tags)
+
+def conditional(tags):
+    """Answer If-None-Match with 304 Not Modified using a version-based ETag.
+
+    tags is a callable returning the tags the response is built from. The
+    strong ETag hashes their versions and the request URL, so it is checked
+    before the view runs any query or serialization.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            request_tags = tags()
+            versions = tag_versions(request_tags)
+            fingerprint = "|".join(f"{tag}={version}" for tag, version in zip(request_tags, versions))
+            etag = hashlib.sha1(f"{request.full_path}|{fingerprint}".encode()).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                rv = Response(status=304)
+            else:
+                rv = make_response(f(*args, **kwargs))
+                if rv.status_code not in (200, 304):
+                    return rv
+            rv.set_etag(etag)
+            # Let browsers keep the response but revalidate it on every request
+            rv.cache_control.private = True
+            rv.cache_control.no_cache = True
+            return rv
+        return decorated_function
+    return decorator
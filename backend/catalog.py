@@ -0,0 +1,44 @@
+from models import Service
+from caching import tag_versions, SERVICES_TAG
+
+# In-process snapshot of the service catalog with pre-serialized dicts.
+# The shared version stamp is the 'services' cache tag, which is bumped by
+# cache_invalidation whenever a Service row is committed, so every worker
+# process only reloads the catalog after an admin actually changed it.
+
+_snapshot = None
+
+class CatalogSnapshot:
+    def __init__(self, version, services):
+        self.version = version
+        self.services = [{
+            "id": service.id,
+            "name": service.name,
+            "price": service.price,
+            "description": service.description,
+            "service_type": service.service_type.name,
+            "created_at": service.created_at
+        } for service in services]
+        self.by_id = {service["id"]: service for service in self.services}
+        # Shape used by the customer dashboard
+        self.available_services = [{
+            "id": service["id"],
+            "name": service["name"],
+            "price": service["price"],
+            "description": service["description"],
+            "service_type": service["service_type"]
+        } for service in self.services]
+
+def catalog_version():
+    return tag_versions([SERVICES_TAG])[0]
+
+def get_catalog():
+    """Return the current catalog snapshot, reloading it only if the version moved."""
+    global _snapshot
+    # Read the version before loading so a concurrent write forces another reload
+    version = catalog_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = CatalogSnapshot(version, Service.query.order_by(Service.id).all())
+        _snapshot = snapshot
+    return snapshot
@@ -1,14 +1,35 @@
-from tasks import create_resource_csv, celery_app
+from tasks import create_resource_csv, import_spreadsheet, celery_app, IMPORT_DIR
 from celery.result import AsyncResult
-from flask import Flask, jsonify, send_file
+from flask import Flask, jsonify, send_file, request, make_response, Response, stream_with_context
 from flask_restful import Resource
+from flask_security import auth_required, roles_accepted
+from datetime import date
+from models import ServiceStatusEnum
+import gzip
+import os
+import uuid
+from importer import IMPORTERS, IMPORT_EXTENSIONS
 
 
 # @app.get('/downloadcsv')
 # def download_csv():
 class DownloadCSV(Resource):
     def get(self):
-        task = create_resource_csv.delay()
+        # Optional filters: ?status=CLOSED&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+        status = request.args.get('status', 'CLOSED').upper()
+        if status not in ServiceStatusEnum.__members__:
+            return make_response(jsonify({"error": f"Invalid status. Must be one of: {list(ServiceStatusEnum.__members__)}"}), 400)
+
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        try:
+            for value in (start_date, end_date):
+                if value:
+                    date.fromisoformat(value)
+        except ValueError:
+            return make_response(jsonify({"error": "Invalid date format. Please use ISO format (YYYY-MM-DD)"}), 400)
+
+        task = create_resource_csv.delay(status=status, start_date=start_date, end_date=end_date)
         return {"task_id": task.id}
 
 # @app.get('/getcsv/<task_id>')
@@ -16,9 +37,65 @@ class DownloadCSV(Resource):
 class GetCSV(Resource):
     def get(self, task_id):
         res = AsyncResult(task_id, app=celery_app)
+        if res.failed():
+            return make_response(jsonify({"error": "CSV export failed"}), 500)
         if res.ready():
             filename = res.result
-            return send_file(filename, as_attachment=True)
+            if 'gzip' in request.accept_encodings:
+                # Serve the compressed file as-is; send_file handles Range requests
+                response = send_file(filename, mimetype='text/csv', as_attachment=True,
+                                     download_name='service_requests.csv', conditional=True)
+                response.headers['Content-Encoding'] = 'gzip'
+                response.vary.add('Accept-Encoding')
+                return response
+
+            def generate():
+                with gzip.open(filename, 'rb') as f:
+                    while chunk := f.read(64 * 1024):
+                        yield chunk
+
+            return Response(stream_with_context(generate()), mimetype='text/csv', headers={
+                'Content-Disposition': 'attachment; filename=service_requests.csv',
+                'Vary': 'Accept-Encoding'
+            })
         
         else:
-            return jsonify({"status": "Task pending"}), 400
\ No newline at end of file
+            return make_response(jsonify({"status": "Task pending"}), 400)
+
+class ImportUpload(Resource):
+    @auth_required('token')
+    @roles_accepted('admin')
+    def post(self, kind):
+        if kind not in IMPORTERS:
+            return make_response(jsonify({"error": f"Invalid import type. Must be one of: {list(IMPORTERS)}"}), 400)
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return make_response(jsonify({"error": "No file provided"}), 400)
+        extension = os.path.splitext(upload.filename)[1].lower()
+        if extension not in IMPORT_EXTENSIONS:
+            return make_response(jsonify({"error": f"Unsupported file type. Must be one of: {list(IMPORT_EXTENSIONS)}"}), 400)
+
+        # Streamed to disk; the worker reads it back row by row
+        os.makedirs(IMPORT_DIR, exist_ok=True)
+        file_path = os.path.join(IMPORT_DIR, f"{kind}_{uuid.uuid4()}{extension}")
+        upload.save(file_path)
+        try:
+            task = import_spreadsheet.delay(kind, file_path)
+        except Exception:
+            # The task owns the file only once it is queued
+            os.remove(file_path)
+            raise
+        return make_response(jsonify({"task_id": task.id}), 202)
+
+class ImportStatus(Resource):
+    @auth_required('token')
+    @roles_accepted('admin')
+    def get(self, task_id):
+        res = AsyncResult(task_id, app=celery_app)
+        if res.failed():
+            return make_response(jsonify({"status": "failed", "error": str(res.result)}), 500)
+        if res.successful():
+            return jsonify(dict(res.result, status="completed"))
+        if res.state == 'PROGRESS':
+            return jsonify(dict(res.info, status="running"))
+        return jsonify({"status": "pending"})
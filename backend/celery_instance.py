@@ -1,6 +1,6 @@
 from celery import Celery
 
-# Create a placeholder Celery app - will be configured properly in app.py
+# Create a placeholder Celery app - configured by app.create_app or worker.py
 celery_app = Celery("household_services")
 
 def configure_celery(app):
@@ -11,6 +11,8 @@ def configure_celery(app):
     celery_app.conf.broker_url = app.config.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     celery_app.conf.result_backend = app.config.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
     celery_app.conf.broker_connection_retry_on_startup = True
+    # Seconds task results are kept; export and upload files are removed after the same time
+    celery_app.conf.result_expires = app.config.get('CELERY_RESULT_EXPIRES', 24 * 60 * 60)
     
     # Properly set the timezone to ensure consistency
     celery_app.conf.timezone = 'Asia/Kolkata'  # Note capitalization of 'Kolkata'
@@ -22,9 +24,15 @@ def configure_celery(app):
     class ContextTask(celery_app.Task):
         # Ensure each task gets its own application context
         def __call__(self, *args, **kwargs):
-            with celery_app.flask_app.app_context():
+            with flask_app().app_context():
                 return self.run(*args, **kwargs)
     
     # Override the base task class for all tasks
     celery_app.Task = ContextTask
     return celery_app
+
+def flask_app():
+    """The Flask app tasks run in; builds the slim worker app if none is configured yet."""
+    if getattr(celery_app, 'flask_app', None) is None:
+        import worker  # noqa: F401 - configures celery_app on import
+    return celery_app.flask_app
@@ -1,5 +1,26 @@
+import os
+
+# 'web' for the API server, 'worker' for Celery; picks the database pool settings
+PROCESS_TYPE = os.environ.get('PROCESS_TYPE', 'web')
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///data.sqlite3'
+    # Set DATABASE_URL to use a server database instead of the local SQLite file
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///data.sqlite3')
+    # Applied to every new SQLite connection, ignored for other databases.
+    # WAL lets readers run alongside the single writer, and busy_timeout makes
+    # writers wait for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Durable in WAL mode except on power loss
+        'busy_timeout': 5000,  # ms
+        'mmap_size': 256 * 1024 * 1024,  # bytes
+        'cache_size': -64 * 1024,  # negative means KiB
+    }
+    # SQLAlchemy pool settings per process type
+    DATABASE_POOL_OPTIONS = {
+        'web': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True},
+        'worker': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 30, 'pool_recycle': 1800, 'pool_pre_ping': True},
+    }
     SECRET_KEY = "shhh..secret"
     SECURITY_TOKEN_AUTHENTICATION_HEADER = 'Authorization'
     SECURITY_REDIRECT_BEHAVIOR = "spa"
@@ -7,6 +28,17 @@ class Config:
     SECURITY_FLASH_MESSAGES = False
     WTF_CSRF_ENABLED = False
     SECURITY_JOIN_USER_ROLES = 'role_user'
+    # Password hashing cost. Raising it rehashes each password on that user's next sign-in.
+    SECURITY_PASSWORD_HASH = 'argon2'
+    SECURITY_PASSWORD_HASH_PASSLIB_OPTIONS = {
+        'argon2__rounds': 3,
+        'argon2__memory_cost': 64 * 1024,  # KiB
+        'argon2__parallelism': 4,
+    }
+    # Threads hashing passwords, and how many more requests may wait for one
+    # before sign-ins are shed with a 503. Half the cores are left for serving.
+    PASSWORD_HASH_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+    PASSWORD_HASH_QUEUE_LIMIT = 16
 
 class localdev(Config):
     DEBUG = True
@@ -4,7 +4,8 @@ from celery_instance import celery_app
 class FlaskTask(Task):
     def __call__(self, *args, **kwargs):
         # Import app inside method to avoid circular imports
-        from app import app
+        from celery_instance import flask_app
+        app = flask_app()
         
         # Ensure we're running within the application context
         with app.app_context():
@@ -0,0 +1,9 @@
+# Helpers for code that may run under the gevent server (serve.py).
+
+def gevent_active():
+    """True once gevent has monkey patched this process."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
@@ -0,0 +1,96 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from models import db
+
+# Engine setup shared by the web app and Celery workers: pool sizes for the
+# process type and connection pragmas for SQLite. A server database URI only
+# picks up the pool settings.
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(config, process_type):
+    """SQLALCHEMY_ENGINE_OPTIONS for this process type, with explicit settings winning."""
+    options = {}
+    # In-memory SQLite uses a single shared connection, not a sized pool
+    if not is_memory_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        options.update(config.get('DATABASE_POOL_OPTIONS', {}).get(process_type, {}))
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    return options
+
+def register_sqlite_pragmas(engine, pragmas):
+    """Run the pragmas on every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def init_database(app, process_type):
+    """db.init_app with pool settings and SQLite pragmas applied."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, process_type)
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            register_sqlite_pragmas(engine, app.config.get('SQLITE_PRAGMAS'))
+
+def benchmark(pragmas, readers, writers, seconds):
+    """Mixed readers and writers on a scratch SQLite file; returns (reads, writes, lock errors)."""
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    engine = create_engine(f'sqlite:///{path}', pool_size=readers + writers)
+    register_sqlite_pragmas(engine, pragmas)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, value INTEGER)"))
+        connection.execute(text("INSERT INTO item (value) VALUES (:value)"), [{'value': i} for i in range(10000)])
+
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def run(statement, params, kind):
+        done = errors = 0
+        while time.monotonic() < deadline:
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(statement), params)
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts[kind] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=run, args=("SELECT sum(value) FROM item WHERE id > :id", {'id': 5000}, 'reads'))
+               for _ in range(readers)]
+    threads += [threading.Thread(target=run, args=("UPDATE item SET value = value + 1 WHERE id = :id", {'id': 1}, 'writes'))
+                for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counts['reads'], counts['writes'], counts['errors']
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Compare SQLite defaults with the configured pragmas under concurrent load.')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    for label, pragmas in (('defaults', {}), ('tuned', Config.SQLITE_PRAGMAS)):
+        reads, writes, errors = benchmark(pragmas, args.readers, args.writers, args.seconds)
+        print(f"{label}: {reads / args.seconds:.0f} reads/s, {writes / args.seconds:.0f} writes/s, {errors} lock errors")
@@ -0,0 +1,214 @@
+import csv
+import os
+import uuid
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, select
+from models import db, User, Role, ServiceProfessional, ServiceTypeEnum, Service, roles_users
+from caching import SERVICES_TAG, SERVICE_REQUESTS_TAG, PROFESSIONALS_TAG
+from cache_invalidation import add_cache_tags
+from bulk import insert_returning_ids, service_row
+from passwords import hash_passwords
+
+# Imports services or professional accounts from a CSV or spreadsheet. Rows
+# are streamed from the file and written IMPORT_BATCH_SIZE at a time with
+# executemany INSERTs, one commit per batch, so memory stays bounded by the
+# batch and the set of known emails however long the file is. Bad rows are
+# skipped and reported; the first IMPORT_MAX_ERRORS are kept with their line.
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 100
+# .xlsx goes through pyexcel with the pyexcel-xlsx plugin from requirements.txt
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+
+def normalise(record):
+    return {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+
+def read_rows(file_path):
+    """Yield each data row as a dict keyed by lower-cased header."""
+    if os.path.splitext(file_path)[1].lower() == '.csv':
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            for record in csv.DictReader(f):
+                yield normalise(record)
+    else:
+        import pyexcel
+        try:
+            # Hidden-row handling makes openpyxl load the whole workbook;
+            # without it the sheet is read in read-only, streaming mode
+            for record in pyexcel.iget_records(file_name=file_path, skip_hidden_row_and_column=False):
+                yield normalise(record)
+        finally:
+            pyexcel.free_resources()
+
+def cell(record, field):
+    """A cell as stripped text; spreadsheets hand back numbers for numeric cells."""
+    value = record.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def batches(rows):
+    # Spreadsheet line numbers, counting the header as line 1
+    numbered = enumerate(rows, start=2)
+    while batch := list(islice(numbered, IMPORT_BATCH_SIZE)):
+        yield batch
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors
+        }
+
+def write_batch(report, lines, write):
+    """Run write() and commit; a failed batch is rolled back and reported per line."""
+    try:
+        write()
+        db.session.commit()
+        report.created += len(lines)
+        return True
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error importing batch at line {lines[0]}: {str(e)}")
+        for line in lines:
+            report.error(line, f"Batch failed: {str(e)}")
+        return False
+
+def import_services(file_path, progress=None):
+    """Create a Service for every valid row (name, price, service_type, description)."""
+    report = ImportReport()
+    for batch in batches(read_rows(file_path)):
+        created_at = datetime.utcnow()
+        rows = []
+        lines = []
+        for line, record in batch:
+            record = {field: cell(record, field) for field in ('name', 'price', 'service_type', 'description')}
+            row, error = service_row(record, created_at)
+            if error:
+                report.error(line, error)
+            else:
+                rows.append(row)
+                lines.append(line)
+
+        if rows:
+            def write():
+                db.session.execute(insert(Service), rows)
+                add_cache_tags(db.session, {SERVICES_TAG, SERVICE_REQUESTS_TAG})
+            write_batch(report, lines, write)
+        report.processed += len(batch)
+        if progress:
+            progress(report.as_dict())
+    return report.as_dict()
+
+def professional_row(record):
+    """Validated values for one professional row, or an error message."""
+    email = cell(record, 'email')
+    password = cell(record, 'password')
+    name = cell(record, 'name')
+    pincode = cell(record, 'pincode')
+    if not email or not password or not name:
+        return None, "Email, password, and name are required"
+    if '@' not in email:
+        return None, "Invalid email"
+    try:
+        service_type = ServiceTypeEnum[cell(record, 'service_type').upper()]
+    except KeyError:
+        return None, f"Invalid service type. Must be one of: {[e.name for e in ServiceTypeEnum]}"
+    if pincode and (not pincode.isdigit() or len(pincode) != 6):
+        return None, "Pincode must be 6 digits"
+    try:
+        experience = int(float(cell(record, 'experience') or 0))
+    except ValueError:
+        return None, "Experience must be a number"
+    return {
+        'email': email,
+        'password': password,
+        'name': name,
+        'pincode': pincode or None,
+        'service_type': service_type,
+        'experience': experience,
+        'description': cell(record, 'description'),
+        'approved': cell(record, 'approved').lower() in ('1', 'true', 'yes')
+    }, None
+
+def import_professionals(file_path, progress=None):
+    """
+    Create a User with the professional role and a ServiceProfessional for
+    every valid row (email, password, name, service_type, experience,
+    description, pincode, approved). Emails already registered, or seen
+    earlier in the file, are skipped.
+    """
+    report = ImportReport()
+    # Stored as given, since sign-in matches the address exactly, but compared
+    # lower-cased so the same mailbox is not registered twice
+    emails = set(email.lower() for email in db.session.execute(select(User.email)).scalars())
+    role_id = db.session.execute(select(Role.id).where(Role.name == 'professional')).scalar_one()
+    db.session.commit()
+
+    for batch in batches(read_rows(file_path)):
+        professionals = []
+        lines = []
+        for line, record in batch:
+            professional, error = professional_row(record)
+            if not error and professional['email'].lower() in emails:
+                error = "User already exists"
+            if error:
+                report.error(line, error)
+            else:
+                emails.add(professional['email'].lower())
+                professionals.append(professional)
+                lines.append(line)
+
+        if professionals:
+            password_hashes = hash_passwords([professional['password'] for professional in professionals])
+            created_at = datetime.utcnow()
+
+            def write():
+                user_ids = insert_returning_ids(User, [{
+                    'email': professional['email'],
+                    'password': password_hash,
+                    'active': True,
+                    'created_at': created_at,
+                    'fs_uniquifier': str(uuid.uuid4()),
+                    'pincode': professional['pincode']
+                } for professional, password_hash in zip(professionals, password_hashes)])
+                db.session.execute(insert(roles_users), [
+                    {'user_id': user_id, 'role_id': role_id} for user_id in user_ids
+                ])
+                db.session.execute(insert(ServiceProfessional), [{
+                    'user_id': user_id,
+                    'name': professional['name'],
+                    'service_type': professional['service_type'],
+                    'experience': professional['experience'],
+                    'description': professional['description'],
+                    'approved': professional['approved'],
+                    'blocked': False
+                } for professional, user_id in zip(professionals, user_ids)])
+                add_cache_tags(db.session, {PROFESSIONALS_TAG, SERVICE_REQUESTS_TAG})
+            if not write_batch(report, lines, write):
+                # Nothing from this batch was saved, so later rows may reuse these emails
+                emails.difference_update(professional['email'].lower() for professional in professionals)
+        report.processed += len(batch)
+        if progress:
+            progress(report.as_dict())
+    return report.as_dict()
+
+IMPORTERS = {
+    'services': import_services,
+    'professionals': import_professionals
+}
@@ -1,6 +1,7 @@
 import argparse
 from models import db, user_datastore, Admin
 from app import app
+from migrate import upgrade
 from flask_security.utils import hash_password
 
 parser = argparse.ArgumentParser(description='Initialize the database.')
@@ -14,6 +15,9 @@ with app.app_context():
     # Create all tables
     db.create_all()
 
+    # Record the schema version so migrate.py only applies newer migrations
+    upgrade()
+
     # Ensure roles exist
     for role in ['admin', 'professional', 'customer']:
         if not user_datastore.find_role(role):
@@ -0,0 +1,90 @@
+import argparse
+import json
+import statistics
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+# Small load generator for comparing serving modes, e.g.
+#   python app.py            (threaded dev server)
+#   python serve.py          (gevent)
+#   python loadtest.py --path /signin --json '{"email": "admin@abc.com", "password": "admin123"}'
+# --burst-path adds a second load running alongside, e.g. a sign-in storm while
+# measuring /ready.
+
+def run(url, body, headers, concurrency, total):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(url, data=body, headers=headers)) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as e:
+                status = e.code
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), statuses
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure throughput and latency of one endpoint.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--path', default='/ready')
+    parser.add_argument('--json', help='JSON body; sends a POST when given')
+    parser.add_argument('--token', help='Authentication token')
+    parser.add_argument('-c', '--concurrency', type=int, default=20)
+    parser.add_argument('-n', '--requests', type=int, default=500)
+    parser.add_argument('--burst-path', help='Endpoint hammered in the background during the run')
+    parser.add_argument('--burst-json', help='JSON body for the burst; sends a POST when given')
+    parser.add_argument('--burst-concurrency', type=int, default=50)
+    parser.add_argument('--burst-requests', type=int, default=500)
+    args = parser.parse_args()
+
+    headers = {}
+    body = None
+    if args.json:
+        body = json.dumps(json.loads(args.json)).encode()
+        headers['Content-Type'] = 'application/json'
+    if args.token:
+        headers['Authorization'] = args.token
+
+    def report(label, elapsed, latencies, statuses):
+        print(f"{label}: {len(latencies)} requests in {elapsed:.2f}s: {len(latencies) / elapsed:.0f} req/s, statuses {statuses}")
+        print(f"    latency p50 {statistics.median(latencies) * 1000:.0f}ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f}ms, max {latencies[-1] * 1000:.0f}ms")
+
+    burst = None
+    if args.burst_path:
+        burst_headers = {'Content-Type': 'application/json'} if args.burst_json else {}
+        burst_body = json.dumps(json.loads(args.burst_json)).encode() if args.burst_json else None
+        burst_result = []
+        burst = threading.Thread(target=lambda: burst_result.append(run(
+            args.base_url + args.burst_path, burst_body, burst_headers, args.burst_concurrency, args.burst_requests)))
+        burst.start()
+        # Let the burst saturate the server first
+        time.sleep(0.5)
+
+    report(args.path, *run(args.base_url + args.path, body, headers, args.concurrency, args.requests))
+    if burst:
+        burst.join()
+        report(args.burst_path, *burst_result[0])
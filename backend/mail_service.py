@@ -1,4 +1,5 @@
-from smtplib import SMTP, SMTPException
+import time
+from smtplib import SMTP, SMTPException, SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -6,20 +7,110 @@ SMTP_HOST = "localhost"
 SMTP_PORT = 1025
 SENDER_EMAIL = "23f2004759@ds.study.iitm.ac.in"
 SENDER_PASSWORD = ""
+# Reconnect after this many messages so one connection never lives forever
+MESSAGES_PER_CONNECTION = 100
+# Attempts per message before giving up, with exponential backoff in seconds
+MAX_SEND_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
 
-def send_message(to, subject, content_body):
-    """Send an email to the recipient."""
+def build_message(to, subject, content_body):
     msg = MIMEMultipart()
     msg["To"] = to 
     msg["Subject"] = subject
     msg["From"] = SENDER_EMAIL
     msg.attach(MIMEText(content_body, "html"))
+    return msg
+
+class SMTPMailer:
+    """Delivers many messages over one reused SMTP connection.
+
+    The connection is opened lazily, recycled every messages_per_connection
+    messages and re-established after a failure. Temporary failures are
+    retried with exponential backoff; permanent (5xx) rejections are not.
+    Use as a context manager so the connection is closed at the end.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, messages_per_connection=MESSAGES_PER_CONNECTION,
+                 max_attempts=MAX_SEND_ATTEMPTS, backoff=RETRY_BACKOFF):
+        self.host = host
+        self.port = port
+        self.messages_per_connection = messages_per_connection
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.client = None
+        self.sent_on_connection = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
-    try:
-        client = SMTP(host=SMTP_HOST, port=SMTP_PORT)
-        client.send_message(msg)
-        client.quit()
-        print("Email sent successfully")
-    except SMTPException as e:
-        print(f"Failed to send email: {e}")
+    def connect(self):
+        self.client = SMTP(host=self.host, port=self.port)
+        if SENDER_PASSWORD:
+            self.client.login(SENDER_EMAIL, SENDER_PASSWORD)
+        self.sent_on_connection = 0
+
+    def close(self):
+        if self.client is None:
+            return
+        try:
+            self.client.quit()
+        except (SMTPException, OSError):
+            self.client.close()
+        self.client = None
+
+    def send(self, msg):
+        """Send one message, reconnecting and retrying as needed. Returns True on success."""
+        for attempt in range(self.max_attempts):
+            try:
+                if self.client is None or self.sent_on_connection >= self.messages_per_connection:
+                    self.close()
+                    self.connect()
+                self.client.send_message(msg)
+                self.sent_on_connection += 1
+                return True
+            except SMTPServerDisconnected as e:
+                # The server dropped the connection; reconnect and try again
+                error = e
+            except SMTPRecipientsRefused as e:
+                # Every recipient was rejected; retrying won't help and the connection is still usable
+                print(f"Failed to send email to {msg['To']}: {e}")
+                return False
+            except SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    print(f"Failed to send email to {msg['To']}: {e}")
+                    return False
+                error = e
+            except (SMTPException, OSError) as e:
+                error = e
+            # Drop the connection; the next attempt starts from a fresh one
+            self.close()
+            if attempt + 1 < self.max_attempts:
+                time.sleep(self.backoff * 2 ** attempt)
+        print(f"Failed to send email to {msg['To']} after {self.max_attempts} attempts: {error}")
+        return False
+
+    def send_many(self, messages):
+        """Send (to, subject, content_body) emails; returns the recipients that failed."""
+        failed = []
+        for to, subject, content_body in messages:
+            if not self.send(build_message(to, subject, content_body)):
+                failed.append(to)
+        return failed
+
+def send_message(to, subject, content_body):
+    """Send an email to the recipient."""
+    with SMTPMailer() as mailer:
+        if mailer.send(build_message(to, subject, content_body)):
+            print("Email sent successfully")
 
+def send_messages(messages):
+    """Send a batch of (to, subject, content_body) emails over one connection."""
+    messages = list(messages)
+    with SMTPMailer() as mailer:
+        failed = mailer.send_many(messages)
+    sent = len(messages) - len(failed)
+    print(f"{sent} emails sent successfully, {len(failed)} failed")
+    return sent
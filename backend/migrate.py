@@ -0,0 +1,114 @@
+import argparse
+from sqlalchemy import text
+from models import db, User, ServiceRequest, ServiceRequestStats, ServiceStatusEnum, ServiceTypeEnum, Service, ServiceProfessional
+from stats import rebuild_stats
+from search_index import fts_enabled, create_professional_fts, create_service_fts
+
+# Versioned schema migrations for existing databases.
+# Each entry is (version, description, function); functions must be idempotent
+# and are applied in order for every version above the stored one.
+
+def create_table_indexes(model):
+    """Create every index declared on a model that does not exist yet."""
+    for index in model.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+def add_hot_path_indexes():
+    create_table_indexes(ServiceRequest)
+    create_table_indexes(User)
+
+def add_service_request_stats():
+    ServiceRequestStats.__table__.create(bind=db.engine, checkfirst=True)
+    rebuild_stats()
+
+def add_professional_fts():
+    if fts_enabled():
+        create_professional_fts()
+
+def add_service_search_indexes():
+    create_table_indexes(Service)
+    create_table_indexes(ServiceProfessional)
+    if fts_enabled():
+        create_service_fts()
+
+def rekey_undated_requests():
+    # Undated requests used to be rolled up under the month they were written in
+    if db.session.query(ServiceRequest.id).filter(ServiceRequest.date_of_request.is_(None)).first():
+        rebuild_stats()
+
+MIGRATIONS = [
+    (1, "Indexes for ServiceRequest access paths and User.pincode", add_hot_path_indexes),
+    (2, "ServiceRequestStats rollup table", add_service_request_stats),
+    (3, "Full-text index over professional name and description", add_professional_fts),
+    (4, "Service search: price and availability indexes, full-text index over services", add_service_search_indexes),
+    (5, "Roll up requests without a date_of_request under a fixed month", rekey_undated_requests),
+]
+
+def get_schema_version():
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+def set_schema_version(version):
+    with db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+
+def upgrade():
+    """Apply every pending migration and return the resulting schema version."""
+    current = get_schema_version()
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"Applying migration {version}: {description}")
+        migration()
+        set_schema_version(version)
+        current = version
+    return current
+
+def hot_queries():
+    """The filters used by dashboards, daily_reminder, CSV export and search."""
+    pending = [ServiceStatusEnum.REQUESTED, ServiceStatusEnum.ACCEPTED]
+    return {
+        "professional requests": ServiceRequest.query.filter(ServiceRequest.professional_id == 1),
+        "professional pending requests": ServiceRequest.query.filter(
+            ServiceRequest.professional_id == 1, ServiceRequest.service_status.in_(pending)),
+        "pending requests by professional": db.session.query(
+            ServiceRequest.professional_id, db.func.count(ServiceRequest.id)
+        ).filter(ServiceRequest.service_status.in_(pending)).group_by(ServiceRequest.professional_id),
+        "customer history": ServiceRequest.query.filter(
+            ServiceRequest.customer_id == 1).order_by(ServiceRequest.date_of_request),
+        "requests for service": ServiceRequest.query.filter(ServiceRequest.service_id == 1),
+        "closed requests export": ServiceRequest.query.filter(
+            ServiceRequest.service_status == ServiceStatusEnum.CLOSED),
+        "users by pincode": User.query.filter(User.pincode == '600001'),
+        "services by price range": Service.query.filter(Service.price >= 100, Service.price <= 200),
+        "available professionals of a type": ServiceProfessional.query.filter(
+            ServiceProfessional.service_type == ServiceTypeEnum.PLUMBING,
+            ServiceProfessional.approved == True, ServiceProfessional.blocked == False),
+    }
+
+def explain_hot_queries():
+    """Print the SQLite query plan of each hot query; return False if any does a full scan."""
+    all_indexed = True
+    with db.engine.connect() as conn:
+        for name, query in hot_queries().items():
+            sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+            full_scan = any(step.startswith("SCAN") and "INDEX" not in step for step in plan)
+            all_indexed = all_indexed and not full_scan
+            print(f"{'FULL SCAN' if full_scan else 'OK':9} {name}: {' | '.join(plan)}")
+    return all_indexed
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Upgrade an existing database to the latest schema version.')
+    parser.add_argument('--explain', action='store_true', help='Check that hot queries use an index after upgrading')
+    args = parser.parse_args()
+
+    with app.app_context():
+        version = upgrade()
+        print(f"Database is at schema version {version}")
+        if args.explain and not explain_hot_queries():
+            raise SystemExit(1)
@@ -32,7 +32,7 @@ class User(db.Model, UserMixin):
     roles = db.relationship('Role', secondary=roles_users, backref=db.backref('users', lazy='dynamic'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     fs_uniquifier = db.Column(db.String(64), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
-    pincode = db.Column(db.String(6))
+    pincode = db.Column(db.String(6), index=True)
 
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -61,10 +61,15 @@ class ServiceProfessional(db.Model):
     user = db.relationship('User', backref=db.backref('service_professional', uselist=False))
     service_requests = db.relationship('ServiceRequest', backref='professional', lazy=True)
 
+    # Finding available professionals of a service type
+    __table_args__ = (
+        db.Index('ix_service_professional_type_available', 'service_type', 'approved', 'blocked'),
+    )
+
 class Service(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)  # Base price for the service
+    price = db.Column(db.Float, nullable=False, index=True)  # Base price for the service
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     service_requests = db.relationship('ServiceRequest', backref='service', lazy=True)
@@ -79,14 +84,52 @@ class ServiceStatusEnum(Enum):
 
 class ServiceRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    service_status = db.Column(db.Enum(ServiceStatusEnum), default=ServiceStatusEnum.REQUESTED)
+    # Columns rolled up into ServiceRequestStats load their old value before a
+    # change (active_history), even on an expired row, so stats.py can always
+    # subtract the right key
+    service_status = db.column_property(
+        db.Column(db.Enum(ServiceStatusEnum), default=ServiceStatusEnum.REQUESTED), active_history=True)
     remarks = db.Column(db.String, nullable=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
-    professional_id = db.Column(db.Integer, db.ForeignKey('service_professional.id'), nullable=True)
-    service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
-    date_of_request = db.Column(db.DateTime, default=datetime.utcnow)
+    customer_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False), active_history=True)
+    professional_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('service_professional.id'), nullable=True), active_history=True)
+    service_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False), active_history=True)
+    date_of_request = db.column_property(db.Column(db.DateTime, default=datetime.utcnow), active_history=True)
     preferred_date = db.Column(db.DateTime, nullable=True)  # Customer's preferred service date
-    price = db.Column(db.Float, nullable=True)  # Final price for this service request
+    price = db.column_property(
+        db.Column(db.Float, nullable=True), active_history=True)  # Final price for this service request
+
+    # Indexes matching the dashboard, reminder and export access paths
+    __table_args__ = (
+        db.Index('ix_service_request_professional_status', 'professional_id', 'service_status'),
+        db.Index('ix_service_request_customer_date', 'customer_id', 'date_of_request'),
+        db.Index('ix_service_request_service_id', 'service_id'),
+        db.Index('ix_service_request_status_date', 'service_status', 'date_of_request'),
+    )
+
+class ServiceRequestStats(db.Model):
+    """Rollup of service requests per customer, professional, service, status and month.
+
+    Maintained by stats.py in the same transaction as every ServiceRequest
+    change; `python stats.py --rebuild` recomputes it from scratch.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, nullable=False)
+    professional_id = db.Column(db.Integer, nullable=False, default=0)  # 0 while unassigned
+    service_id = db.Column(db.Integer, nullable=False)
+    service_status = db.Column(db.Enum(ServiceStatusEnum), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM of date_of_request
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    total_price = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'professional_id', 'service_id', 'service_status', 'month',
+                            name='uq_service_request_stats_key'),
+        db.Index('ix_service_request_stats_month_customer', 'month', 'customer_id'),
+        db.Index('ix_service_request_stats_professional_status', 'professional_id', 'service_status'),
+    )
 
 user_datastore = SQLAlchemyUserDatastore(db, User, Role)
 
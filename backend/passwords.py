@@ -0,0 +1,78 @@
+import contextvars
+import threading
+from flask import current_app
+from flask_security.utils import hash_password as security_hash_password, verify_password
+from cooperative import gevent_active
+
+# Password hashing on a small pool of native threads. argon2 releases the GIL,
+# so hashes run in parallel while request threads or greenlets wait on the
+# result. At most PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT requests
+# can be hashing or waiting; beyond that callers get HashingOverloaded right
+# away so a sign-in storm is shed instead of starving the rest of the app.
+
+class HashingOverloaded(Exception):
+    """Every hashing slot is taken; the caller should answer 503."""
+
+class HashingPool:
+    def __init__(self, workers, queue_limit):
+        if gevent_active():
+            # Native threads; waiting on the result yields to other greenlets
+            from gevent.threadpool import ThreadPoolExecutor
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingOverloaded()
+        try:
+            # Carry the app context over for Flask-Security's config lookups
+            context = contextvars.copy_context()
+            return self.executor.submit(context.run, func, *args).result()
+        finally:
+            self.slots.release()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """This process's pool, created on first use so forked workers get their own."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(current_app.config['PASSWORD_HASH_WORKERS'],
+                                    current_app.config['PASSWORD_HASH_QUEUE_LIMIT'])
+    return _pool
+
+def hash_password(password):
+    return get_pool().run(security_hash_password, password)
+
+def hash_passwords(passwords):
+    """
+    Hash a batch in parallel on the pool, for imports. Batches are not shed;
+    they only run in the worker, whose pool serves no sign-ins.
+    """
+    executor = get_pool().executor
+    futures = [executor.submit(contextvars.copy_context().run, security_hash_password, password)
+               for password in passwords]
+    return [future.result() for future in futures]
+
+def verify_and_rehash(password, stored_hash):
+    """(verified, new hash or None) for a stored hash made with outdated settings."""
+    if not verify_password(password, stored_hash):
+        return False, None
+    if current_app.extensions['security'].pwd_context.needs_update(stored_hash):
+        return True, security_hash_password(password)
+    return True, None
+
+def check_password(password, user):
+    """
+    Verify a sign-in password in the pool. If the hash settings changed since
+    it was stored, user.password is replaced; the caller commits.
+    """
+    verified, new_hash = get_pool().run(verify_and_rehash, password, user.password)
+    if new_hash:
+        user.password = new_hash
+    return verified
@@ -0,0 +1,80 @@
+from collections import namedtuple
+from flask import g
+from flask_principal import identity_loaded, RoleNeed, UserNeed
+from flask_security import current_user
+from sqlalchemy import select
+from models import db, User, Role, Customer, ServiceProfessional, Admin, roles_users
+from caching import cache
+
+# Who the authenticated user is, cached per fs_uniquifier so token requests
+# don't reload roles and profile rows on every call. Entries are evicted by
+# cache_invalidation when the user or one of their profiles changes (for
+# example an admin deactivating a customer or blocking a professional), and
+# expire after PRINCIPAL_TIMEOUT seconds as a backstop.
+
+PRINCIPAL_TIMEOUT = 300
+
+class Principal(namedtuple('Principal', [
+    'user_id', 'active', 'roles', 'customer_id', 'professional_id', 'admin_id', 'blocked'
+])):
+    __slots__ = ()
+
+    @property
+    def role(self):
+        """The user's primary role name, as used by the handlers."""
+        return self.roles[0] if self.roles else None
+
+def principal_key(fs_uniquifier):
+    return f"principal/{fs_uniquifier}"
+
+def load_principal(user):
+    roles = tuple(db.session.execute(
+        select(Role.name).join(roles_users, roles_users.c.role_id == Role.id)
+        .where(roles_users.c.user_id == user.id).order_by(roles_users.c.role_id)
+    ).scalars())
+    profile = db.session.execute(
+        select(Customer.id, ServiceProfessional.id, ServiceProfessional.blocked, Admin.id)
+        .select_from(User)
+        .outerjoin(Customer, Customer.user_id == User.id)
+        .outerjoin(ServiceProfessional, ServiceProfessional.user_id == User.id)
+        .outerjoin(Admin, Admin.user_id == User.id)
+        .where(User.id == user.id)
+    ).one()
+    customer_id, professional_id, blocked, admin_id = profile
+    return Principal(user.id, user.active, roles, customer_id, professional_id, admin_id, bool(blocked))
+
+def get_principal(user):
+    """The cached principal for user, loaded at most once per request."""
+    principal = g.get('principal')
+    if principal is not None and principal.user_id == user.id:
+        return principal
+    key = principal_key(user.fs_uniquifier)
+    principal = cache.get(key)
+    if principal is None or principal.user_id != user.id:
+        principal = load_principal(user)
+        cache.set(key, principal, timeout=PRINCIPAL_TIMEOUT)
+    g.principal = principal
+    return principal
+
+def current_principal():
+    """Principal of the authenticated user; use instead of re-querying profiles."""
+    return get_principal(current_user)
+
+def evict_principals(fs_uniquifiers):
+    if fs_uniquifiers:
+        cache.delete_many(*[principal_key(fs_uniquifier) for fs_uniquifier in fs_uniquifiers])
+
+def on_identity_loaded(sender, identity):
+    # Same needs as Flask-Security's handler, with roles from the principal
+    # instead of a lazy load of current_user.roles
+    if current_user and hasattr(current_user, "fs_uniquifier"):
+        identity.provides.add(UserNeed(current_user.fs_uniquifier))
+        for role in get_principal(current_user).roles:
+            identity.provides.add(RoleNeed(role))
+    identity.user = current_user
+
+def register_principal_loader(app):
+    """Swap Flask-Security's identity handler for the cached one; call after Security(app)."""
+    from flask_security.core import _on_identity_loaded
+    identity_loaded.disconnect(_on_identity_loaded, sender=app)
+    identity_loaded.connect_via(app)(on_identity_loaded)
@@ -0,0 +1,37 @@
+from sqlalchemy import case, cast, false, func, Integer
+
+# Pincode proximity as SQL expressions over a pincode column.
+# Indian pincodes are hierarchical: the first digit is the region, the first
+# two the sub-region, the first three the sorting district and the last three
+# the delivery office. Two pincodes are closer the longer their common prefix,
+# so distance = 6 - common prefix length. A search keeps pincodes sharing at
+# least the shortest allowed prefix, which is a range scan on the pincode
+# index, and orders by distance inside the same query.
+
+PINCODE_LENGTH = 6
+MIN_PREFIX_LENGTH = 3
+# Default cutoff: same sorting district
+PINCODE_MAX_DISTANCE = PINCODE_LENGTH - MIN_PREFIX_LENGTH
+
+def prefix_lengths(pincode, max_distance=PINCODE_MAX_DISTANCE):
+    """Prefix lengths to match, longest (nearest) first."""
+    shortest = max(PINCODE_LENGTH - max_distance, MIN_PREFIX_LENGTH)
+    return range(min(len(pincode), PINCODE_LENGTH), shortest - 1, -1)
+
+def nearby(column, pincode, max_distance=PINCODE_MAX_DISTANCE):
+    """
+    (filter, distance, gap) expressions for rows whose column is within
+    max_distance of pincode. gap is the numeric difference, for ordering
+    delivery offices within one distance.
+    """
+    pincode = pincode.strip()
+    lengths = prefix_lengths(pincode, max_distance)
+    if not lengths:
+        return false(), None, None
+    # Prefix match as a range so the pincode index can be used
+    prefix = pincode[:lengths[-1]]
+    in_range = (column >= prefix) & (column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    distance = case(*[(func.substr(column, 1, length) == pincode[:length], PINCODE_LENGTH - length)
+                      for length in lengths])
+    gap = func.abs(cast(column, Integer) - int(pincode)) if pincode.isdigit() else None
+    return in_range, distance, gap
@@ -0,0 +1,184 @@
+from contextlib import contextmanager
+from sqlalchemy import event, text, table, column, or_, exists, null
+from sqlalchemy.orm import aliased, joinedload, contains_eager
+from models import db, User, Customer, ServiceProfessional, ServiceRequest, Service
+from search_index import fts_enabled, match_expression
+from proximity import nearby, PINCODE_MAX_DISTANCE
+
+# Query builders for each read shape used by the API.
+# Every builder eager-loads the relationships its endpoint serializes so the
+# number of SQL statements per request stays constant regardless of row count.
+
+def customer_service_history(customer_id):
+    """Service requests of a customer with their service and professional."""
+    return ServiceRequest.query.options(
+        joinedload(ServiceRequest.service),
+        joinedload(ServiceRequest.professional)
+    ).filter(ServiceRequest.customer_id == customer_id)
+
+def professional_service_requests(professional_id):
+    """Service requests assigned to a professional with their service and customer."""
+    return ServiceRequest.query.options(
+        joinedload(ServiceRequest.service),
+        joinedload(ServiceRequest.customer)
+    ).filter(ServiceRequest.professional_id == professional_id)
+
+def requests_for_service(service_id):
+    """Service requests of a single service with their customer and professional."""
+    return ServiceRequest.query.options(
+        joinedload(ServiceRequest.customer),
+        joinedload(ServiceRequest.professional)
+    ).filter(ServiceRequest.service_id == service_id)
+
+def all_service_requests():
+    """Every service request with service, customer, professional and both users."""
+    return ServiceRequest.query.options(
+        joinedload(ServiceRequest.service),
+        joinedload(ServiceRequest.customer).joinedload(Customer.user),
+        joinedload(ServiceRequest.professional).joinedload(ServiceProfessional.user)
+    ).order_by(ServiceRequest.id)
+
+def all_service_requests_rows():
+    """Single joined query returning one flat row per service request."""
+    customer_user = aliased(User)
+    professional_user = aliased(User)
+    return db.session.query(
+        ServiceRequest.id,
+        ServiceRequest.service_id,
+        Service.name.label('service_name'),
+        ServiceRequest.customer_id,
+        Customer.name.label('customer_name'),
+        customer_user.email.label('customer_email'),
+        ServiceRequest.professional_id,
+        ServiceProfessional.name.label('professional_name'),
+        professional_user.email.label('professional_email'),
+        ServiceRequest.service_status,
+        ServiceRequest.price,
+        ServiceRequest.remarks,
+        ServiceRequest.date_of_request,
+        ServiceRequest.preferred_date
+    ).outerjoin(Service, ServiceRequest.service_id == Service.id) \
+     .outerjoin(Customer, ServiceRequest.customer_id == Customer.id) \
+     .outerjoin(customer_user, Customer.user_id == customer_user.id) \
+     .outerjoin(ServiceProfessional, ServiceRequest.professional_id == ServiceProfessional.id) \
+     .outerjoin(professional_user, ServiceProfessional.user_id == professional_user.id) \
+     .order_by(ServiceRequest.id)
+
+def customers_with_user():
+    """All customers with their user account."""
+    return Customer.query.options(joinedload(Customer.user))
+
+def professionals_with_user():
+    """All professionals with their user account."""
+    return ServiceProfessional.query.options(joinedload(ServiceProfessional.user))
+
+def search_professionals(search=None, name=None, service_type=None, pincode=None,
+                         max_distance=PINCODE_MAX_DISTANCE, available_only=False, page=None, per_page=None):
+    """
+    One query returning (professional, distance) rows, each professional with
+    its user account. search matches name or description, name matches the
+    name only; both use the professional_fts index and rank by relevance.
+    pincode keeps professionals within max_distance of it, nearest first,
+    with distance set; otherwise distance is None. per_page limits the rows
+    returned in the database.
+    """
+    query = ServiceProfessional.query.join(ServiceProfessional.user) \
+        .options(contains_eager(ServiceProfessional.user))
+
+    order = []
+    distance = null()
+    if pincode:
+        in_range, distance, gap = nearby(User.pincode, pincode, max_distance)
+        query = query.filter(in_range)
+        if distance is None:
+            distance = null()
+        else:
+            order.append(distance)
+    query = query.add_columns(distance.label('distance'))
+
+    if service_type:
+        query = query.filter(ServiceProfessional.service_type == service_type)
+    if available_only:
+        query = query.filter(ServiceProfessional.approved == True, ServiceProfessional.blocked == False)
+
+    terms = [expression for expression in (match_expression(search), match_expression(name, 'name')) if expression]
+    if terms and fts_enabled():
+        professional_fts = table('professional_fts', column('rowid'))
+        query = query.join(professional_fts, professional_fts.c.rowid == ServiceProfessional.id) \
+            .filter(text("professional_fts MATCH :fts_match").bindparams(fts_match=" ".join(terms)))
+        order.append(text("bm25(professional_fts)"))
+    else:
+        if search:
+            query = query.filter(or_(ServiceProfessional.name.ilike(f"%{search}%"),
+                                     ServiceProfessional.description.ilike(f"%{search}%")))
+        if name:
+            query = query.filter(ServiceProfessional.name.ilike(f"%{name}%"))
+    # Within one distance, numerically closer delivery offices first
+    if pincode and gap is not None:
+        order.append(gap)
+    query = query.order_by(*order, ServiceProfessional.id)
+
+    if per_page:
+        query = query.limit(per_page).offset((max(page or 1, 1) - 1) * per_page)
+    return query
+
+def search_services(search=None, name=None, service_type=None, min_price=None, max_price=None,
+                    pincode=None, page=1, per_page=20):
+    """
+    One page of services in a single query. search matches name or
+    description through the service_fts index and ranks by relevance;
+    pincode keeps services offered by an approved, unblocked professional
+    living there.
+    """
+    query = Service.query
+
+    if service_type:
+        query = query.filter(Service.service_type == service_type)
+    if min_price is not None:
+        query = query.filter(Service.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Service.price <= max_price)
+    if pincode:
+        query = query.filter(exists().where(
+            ServiceProfessional.service_type == Service.service_type,
+            ServiceProfessional.approved == True,
+            ServiceProfessional.blocked == False,
+            ServiceProfessional.user_id == User.id,
+            User.pincode == pincode
+        ))
+
+    terms = [expression for expression in (match_expression(search), match_expression(name, 'name')) if expression]
+    if terms and fts_enabled():
+        service_fts = table('service_fts', column('rowid'))
+        query = query.join(service_fts, service_fts.c.rowid == Service.id) \
+            .filter(text("service_fts MATCH :fts_match").bindparams(fts_match=" ".join(terms))) \
+            .order_by(text("bm25(service_fts)"), Service.id)
+    else:
+        if search:
+            query = query.filter(or_(Service.name.ilike(f"%{search}%"), Service.description.ilike(f"%{search}%")))
+        if name:
+            query = query.filter(Service.name.ilike(f"%{name}%"))
+        query = query.order_by(Service.id)
+
+    return query.limit(per_page).offset((page - 1) * per_page)
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed on the database engine inside the block.
+
+    Usage:
+        with count_queries() as counter:
+            client.get('/admin/customers', headers=headers)
+        print(counter["count"])
+    """
+    counter = {"count": 0}
+    engine = db.engine
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -1,15 +1,60 @@
+import math
 from flask_restful import Resource
-from flask import request, make_response, jsonify
-from flask_security.utils import hash_password
+from flask import request, make_response, jsonify, Response, stream_with_context, current_app
 from models import db, User, Customer, ServiceProfessional, user_datastore, ServiceRequest, Service, ServiceStatusEnum, Admin, ServiceTypeEnum
 from flask_security import logout_user
-from flask_security.utils import verify_password
 from flask_security import login_user
 from flask_security import auth_required, roles_accepted
 from flask_security import current_user
 from flask import session
 from datetime import datetime  # Correct import
-from caching import cache
+from caching import (cache, cached_per_user, conditional, per_user_tags, CUSTOMER_DASHBOARD_CACHE,
+                     PROFESSIONAL_REQUESTS_CACHE, SERVICES_TAG, SERVICE_REQUESTS_TAG)
+import queries
+from catalog import get_catalog
+from analytics import get_admin_analytics
+from proximity import PINCODE_MAX_DISTANCE
+from tasks import auto_assign_requests
+from passwords import hash_password, check_password, HashingOverloaded
+from principal import current_principal
+from bulk import bulk_update_professionals, bulk_set_customers_active, bulk_create_services, BULK_MAX_ITEMS
+from sqlalchemy import text
+
+# Number of rows fetched per round-trip when streaming large result sets
+STREAM_BATCH_SIZE = 500
+
+# Default and maximum page sizes of search results
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Seconds clients are asked to wait when password hashing is saturated
+HASHING_RETRY_AFTER = 1
+
+def optional_page(query_params):
+    """(page, per_page) when the client asks for a page, otherwise (None, None) for every result."""
+    if 'page' not in query_params and 'per_page' not in query_params:
+        return None, None
+    page = max(int(query_params.get('page', 1)), 1)
+    per_page = min(max(int(query_params.get('per_page', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    return page, per_page
+
+def optional_price(query_params, name):
+    """A price filter from the query string, or None; raises ValueError naming the parameter."""
+    value = query_params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        price = float(value)
+    except ValueError:
+        price = math.nan
+    if not math.isfinite(price):
+        raise ValueError(f"{name} must be a number")
+    return price
+
+def busy_response():
+    response = make_response(jsonify({"error": "Too many sign-in attempts right now, please retry shortly"}), 503)
+    response.headers['Retry-After'] = str(HASHING_RETRY_AFTER)
+    return response
 
 class SignUp(Resource):
     def post(self):
@@ -38,10 +83,15 @@ class SignUp(Resource):
         if User.query.filter_by(email=email).first():
             return make_response(jsonify({"error": "User already exists"}), 400)
 
+        try:
+            password_hash = hash_password(password)
+        except HashingOverloaded:
+            return busy_response()
+
         # Create User with pincode
         new_user = user_datastore.create_user(
             email=email, 
-            password=hash_password(password), 
+            password=password_hash, 
             active=True,
             pincode=pincode
         )
@@ -94,7 +144,11 @@ class SignIn(Resource):
             return make_response(jsonify({"error": "Email and password are required"}), 400)
 
         user = User.query.filter_by(email=email).first()
-        if not user or not verify_password(password, user.password):
+        try:
+            verified = user is not None and check_password(password, user)
+        except HashingOverloaded:
+            return busy_response()
+        if not verified:
             return make_response(jsonify({"error": "Invalid email or password"}), 401)
             
         # Check if user is active before allowing login
@@ -102,6 +156,9 @@ class SignIn(Resource):
             return make_response(jsonify({"error": "Your account has been deactivated. Please contact support."}), 403)
 
         login_user(user)
+        # Persist a password rehashed with the current cost settings
+        if db.session.is_modified(user):
+            db.session.commit()
 
         role = user.roles[0].name
 
@@ -164,8 +221,7 @@ class SignOut(Resource):
                 
                 logout_user()  # Logs out the current user
             
-            # Clear session even if not authenticated
-            cache.clear()
+            # Cached data is invalidated when it changes, not on sign-out
             
             return make_response(jsonify({"message": "Signed out successfully"}), 200)
         except Exception as e:
@@ -177,8 +233,11 @@ class SignOut(Resource):
 class CustomerDashboard(Resource):
     @auth_required('token')
     @roles_accepted('customer')
+    @conditional(per_user_tags(CUSTOMER_DASHBOARD_CACHE, (SERVICES_TAG,)))
+    @cached_per_user(timeout=30, key_prefix=CUSTOMER_DASHBOARD_CACHE, tags=(SERVICES_TAG,))
     def get(self):
-        customer = Customer.query.filter_by(user_id=current_user.id).first()
+        customer_id = current_principal().customer_id
+        customer = db.session.get(Customer, customer_id) if customer_id else None
         if not customer:
             return make_response(jsonify({"error": "Customer profile not found"}), 404)
 
@@ -190,17 +249,10 @@ class CustomerDashboard(Resource):
         }
 
         # Available list of services
-        services = Service.query.all()
-        available_services = [{
-            "id": service.id,
-            "name": service.name,
-            "price": service.price,
-            "description": service.description,
-            "service_type": service.service_type.name
-        } for service in services]
+        available_services = get_catalog().available_services
 
         # History/log of current/past services
-        service_requests = ServiceRequest.query.filter_by(customer_id=customer.id).all()
+        service_requests = queries.customer_service_history(customer.id).all()
         service_history = [{
             "id": request.id,
             "service_name": request.service.name,
@@ -235,8 +287,8 @@ class CustomerServices(Resource):
         if not service_id:
             return make_response(jsonify({"error": "Service ID is required"}), 400)
 
-        customer = Customer.query.filter_by(user_id=current_user.id).first()
-        if not customer:
+        customer_id = current_principal().customer_id
+        if not customer_id:
             return make_response(jsonify({"error": "Customer profile not found"}), 404)
 
         service = Service.query.get(service_id)
@@ -274,7 +326,7 @@ class CustomerServices(Resource):
         
         new_service_request = ServiceRequest(
             service_id=service.id,
-            customer_id=customer.id,
+            customer_id=customer_id,
             professional_id=professional.id if professional else None,
             remarks=remarks,
             service_status=ServiceStatusEnum.REQUESTED,  # Always starts as REQUESTED
@@ -285,6 +337,14 @@ class CustomerServices(Resource):
         db.session.add(new_service_request)
         db.session.commit()
 
+        # Requests without a chosen professional are assigned in the background
+        if not professional:
+            try:
+                auto_assign_requests.delay([new_service_request.id])
+            except Exception as e:
+                # The periodic sweep will still pick the request up
+                print(f"Error queueing assignment for request {new_service_request.id}: {str(e)}")
+
         return make_response(jsonify({
             "message": "Service request created successfully",
             "request_id": new_service_request.id
@@ -302,8 +362,8 @@ class CustomerServices(Resource):
             return make_response(jsonify({"error": "Service request not found"}), 404)
             
         # Check if the request belongs to the current customer
-        customer = Customer.query.filter_by(user_id=current_user.id).first()
-        if not customer or service_request.customer_id != customer.id:
+        customer_id = current_principal().customer_id
+        if not customer_id or service_request.customer_id != customer_id:
             return make_response(jsonify({"error": "Unauthorized access to this service request"}), 403)
 
         # Handle status transitions for customer
@@ -355,22 +415,41 @@ class SearchServices(Resource):
     @roles_accepted('customer')
     def get(self):
         query_params = request.args
-        services = Service.query
 
-        if 'location' in query_params:
-            services = services.filter(Service.location.ilike(f"%{query_params['location']}%"))
-        if 'name' in query_params:
-            services = services.filter(Service.name.ilike(f"%{query_params['name']}%"))
-        if 'pin_code' in query_params:
-            services = services.filter(Service.pin_code == query_params['pin_code'])
+        service_type = query_params.get('service_type', '').upper()
+        if service_type and service_type not in ServiceTypeEnum.__members__:
+            return make_response(jsonify({"error": f"Invalid service type. Must be one of: {[e.name for e in ServiceTypeEnum]}"}), 400)
+        try:
+            min_price = optional_price(query_params, 'min_price')
+            max_price = optional_price(query_params, 'max_price')
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        if min_price is not None and max_price is not None and min_price > max_price:
+            return make_response(jsonify({"error": "min_price must not be greater than max_price"}), 400)
+        try:
+            page = max(int(query_params.get('page', 1)), 1)
+            per_page = min(max(int(query_params.get('per_page', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+        except ValueError:
+            return make_response(jsonify({"error": "page and per_page must be integers"}), 400)
+
+        services = queries.search_services(
+            search=query_params.get('query'),
+            name=query_params.get('name'),
+            service_type=ServiceTypeEnum[service_type] if service_type else None,
+            min_price=min_price,
+            max_price=max_price,
+            pincode=query_params.get('pincode') or query_params.get('pin_code'),
+            page=page,
+            per_page=per_page
+        )
 
         service_list = [{
             "id": service.id,
             "name": service.name,
             "price": service.price,
-            "time_required": service.time_required,
-            "description": service.description
-        } for service in services.all()]
+            "description": service.description,
+            "service_type": service.service_type.name
+        } for service in services]
 
         return jsonify(service_list)
 
@@ -379,25 +458,28 @@ class SearchProfessionals(Resource):
     @roles_accepted('customer', 'admin')
     def get(self):
         query_params = request.args
-        professionals = ServiceProfessional.query
-
-        if 'name' in query_params:
-            professionals = professionals.filter(ServiceProfessional.name.ilike(f"%{query_params['name']}%"))
-        if 'service_type' in query_params:
-            service_type = query_params['service_type'].upper()
-            if service_type in [e.name for e in ServiceTypeEnum]:
-                professionals = professionals.filter(ServiceProfessional.service_type == ServiceTypeEnum[service_type])
-        if 'location' in query_params:
-            professionals = professionals.filter(ServiceProfessional.location.ilike(f"%{query_params['location']}%"))
-        if 'pincode' in query_params:
-            # Get user_ids with matching pincode
-            user_ids = [u.id for u in User.query.filter_by(pincode=query_params['pincode']).all()]
-            professionals = professionals.filter(ServiceProfessional.user_id.in_(user_ids))
-        
+
+        service_type = query_params.get('service_type', '').upper()
+        service_type = ServiceTypeEnum[service_type] if service_type in ServiceTypeEnum.__members__ else None
         # Only show approved and non-blocked professionals to customers
-        if current_user.roles[0].name == "customer":
-            professionals = professionals.filter(ServiceProfessional.approved == True)
-            professionals = professionals.filter(ServiceProfessional.blocked == False)
+        available_only = current_principal().role == "customer"
+
+        try:
+            page, per_page = optional_page(query_params)
+        except ValueError:
+            return make_response(jsonify({"error": "page and per_page must be integers"}), 400)
+
+        # With a pincode, only professionals near it are listed, nearest first
+        rows = queries.search_professionals(
+            search=query_params.get('query'),
+            name=query_params.get('name'),
+            service_type=service_type,
+            pincode=query_params.get('pincode', '').strip(),
+            max_distance=query_params.get('max_distance', PINCODE_MAX_DISTANCE, type=int),
+            available_only=available_only,
+            page=page,
+            per_page=per_page
+        )
 
         professional_list = [{
             "id": professional.id,
@@ -407,8 +489,10 @@ class SearchProfessionals(Resource):
             "experience": professional.experience,
             "description": professional.description,
             "approved": professional.approved,
-            "blocked": professional.blocked
-        } for professional in professionals.all()]
+            "blocked": professional.blocked,
+            "pincode": professional.user.pincode,
+            "distance": distance
+        } for professional, distance in rows]
 
         return jsonify(professional_list)
 
@@ -416,7 +500,8 @@ class adminDashboard(Resource):
     @auth_required('token')
     @roles_accepted('admin')
     def get(self):
-        admin = Admin.query.filter_by(user_id=current_user.id).first()
+        admin_id = current_principal().admin_id
+        admin = db.session.get(Admin, admin_id) if admin_id else None
         if not admin:
             return {"message": "Admin profile not found"}, 404
 
@@ -425,6 +510,12 @@ class adminDashboard(Resource):
             "email": current_user.email,
         }
 
+class AdminAnalytics(Resource):
+    @auth_required('token')
+    @roles_accepted('admin')
+    def get(self):
+        return jsonify(get_admin_analytics())
+
 class adminService(Resource):
     @auth_required('token')
     @roles_accepted('admin')
@@ -523,36 +614,20 @@ class adminService(Resource):
     @auth_required('token')
     @roles_accepted('admin')
     def get(self, service_id=None):
+        catalog = get_catalog()
         if service_id:
-            service = Service.query.get(service_id)
+            service = catalog.by_id.get(service_id)
             if not service:
                 return make_response(jsonify({"error": "Service not found"}), 404)
-            return jsonify({
-                "id": service.id,
-                "name": service.name,
-                "price": service.price,
-                # time_required removed
-                "description": service.description,
-                "service_type": service.service_type.name,
-                "created_at": service.created_at
-            })
+            return jsonify(service)
         else:
-            services = Service.query.all()
-            return jsonify([{
-                "id": service.id,
-                "name": service.name,
-                "price": service.price,
-                # time_required removed
-                "description": service.description,
-                "service_type": service.service_type.name,
-                "created_at": service.created_at
-            } for service in services])
+            return jsonify(catalog.services)
 
 class adminCustomers(Resource):
     @auth_required('token')
     @roles_accepted('admin')
     def get(self):
-        customers = Customer.query.all()
+        customers = queries.customers_with_user().all()
         customer_list = [{
             "id": customer.id,
             "user_id": customer.user_id,
@@ -609,7 +684,7 @@ class adminProfessional(Resource):
     @auth_required('token')
     @roles_accepted('admin')
     def get(self):
-        professionals = ServiceProfessional.query.all()
+        professionals = queries.professionals_with_user().all()
         professional_list = [{
             "id": professional.id,
             "user_id": professional.user_id,
@@ -638,6 +713,77 @@ class adminProfessional(Resource):
         db.session.commit()
         return make_response(jsonify({"message": f"Professional status updated successfully"}), 200)
 
+def bulk_list(data, field):
+    """The list under field in a bulk request body, or an error response."""
+    items = data.get(field) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, make_response(jsonify({"error": f"'{field}' must be a non-empty list"}), 400)
+    if len(items) > BULK_MAX_ITEMS:
+        return None, make_response(jsonify({"error": f"At most {BULK_MAX_ITEMS} items per request"}), 400)
+    return items, None
+
+def bulk_response(results, done_status):
+    done = sum(1 for result in results if result["status"] == done_status)
+    return make_response(jsonify({
+        done_status: done,
+        "failed": len(results) - done,
+        "results": results
+    }), 200)
+
+class adminProfessionalBulk(Resource):
+    @auth_required('token')
+    @roles_accepted('admin')
+    def put(self):
+        data = request.get_json(silent=True)
+        ids, error = bulk_list(data, 'ids')
+        if error:
+            return error
+        values = {field: data[field] for field in ('approved', 'blocked') if field in data}
+        if not values:
+            return make_response(jsonify({"error": "Provide 'approved' and/or 'blocked'"}), 400)
+        if not all(isinstance(value, bool) for value in values.values()):
+            return make_response(jsonify({"error": "'approved' and 'blocked' must be booleans"}), 400)
+        try:
+            results = bulk_update_professionals(ids, values)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error updating professionals in bulk: {str(e)}")
+            return make_response(jsonify({"error": str(e)}), 500)
+        return bulk_response(results, "updated")
+
+class adminCustomersBulk(Resource):
+    @auth_required('token')
+    @roles_accepted('admin')
+    def put(self):
+        data = request.get_json(silent=True)
+        ids, error = bulk_list(data, 'ids')
+        if error:
+            return error
+        if not isinstance(data.get('active'), bool):
+            return make_response(jsonify({"error": "'active' must be a boolean"}), 400)
+        try:
+            results = bulk_set_customers_active(ids, data['active'])
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error updating customers in bulk: {str(e)}")
+            return make_response(jsonify({"error": str(e)}), 500)
+        return bulk_response(results, "updated")
+
+class adminServiceBulk(Resource):
+    @auth_required('token')
+    @roles_accepted('admin')
+    def post(self):
+        services, error = bulk_list(request.get_json(silent=True), 'services')
+        if error:
+            return error
+        try:
+            results = bulk_create_services(services)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating services in bulk: {str(e)}")
+            return make_response(jsonify({"error": str(e)}), 500)
+        return bulk_response(results, "created")
+
 # Add a new endpoint for finding professionals by service type
 class ProfessionalsByServiceType(Resource):
     @auth_required('token')
@@ -647,19 +793,30 @@ class ProfessionalsByServiceType(Resource):
         if not service:
             return make_response(jsonify({"error": "Service not found"}), 404)
             
-        professionals = ServiceProfessional.query.filter_by(service_type=service.service_type)
-        
-        # Filter for approved and non-blocked professionals for customers
-        if current_user.roles[0].name == "customer":
-            professionals = professionals.filter_by(approved=True, blocked=False)
+        try:
+            page, per_page = optional_page(request.args)
+        except ValueError:
+            return make_response(jsonify({"error": "page and per_page must be integers"}), 400)
+
+        # Filter for approved and non-blocked professionals for customers;
+        # with a pincode, only professionals near it are listed, nearest first
+        rows = queries.search_professionals(
+            service_type=service.service_type,
+            pincode=request.args.get('pincode', '').strip(),
+            max_distance=request.args.get('max_distance', PINCODE_MAX_DISTANCE, type=int),
+            available_only=current_principal().role == "customer",
+            page=page,
+            per_page=per_page
+        )
 
         professionals_list = [{
             "id": professional.id,
             "name": professional.name,
             "service_type": professional.service_type.name,
             "experience": professional.experience,
-            "description": professional.description
-        } for professional in professionals.all()]
+            "description": professional.description,
+            "distance": distance
+        } for professional, distance in rows]
         
         return jsonify({
             "service": {
@@ -674,15 +831,16 @@ class ProfessionalsByServiceType(Resource):
 class ProfessionalServiceRequests(Resource):
     @auth_required('token')
     @roles_accepted('professional')
-    @cache.cached(timeout=30, key_prefix='ProfessionalServiceRequests.get')
+    @conditional(per_user_tags(PROFESSIONAL_REQUESTS_CACHE, (SERVICES_TAG,)))
+    @cached_per_user(timeout=30, key_prefix=PROFESSIONAL_REQUESTS_CACHE, tags=(SERVICES_TAG,))
     def get(self):
         # Get the current professional
-        professional = ServiceProfessional.query.filter_by(user_id=current_user.id).first()
-        if not professional:
+        professional_id = current_principal().professional_id
+        if not professional_id:
             return make_response(jsonify({"error": "Professional profile not found"}), 404)
 
         # Get all service requests assigned to this professional
-        service_requests = ServiceRequest.query.filter_by(professional_id=professional.id).all()
+        service_requests = queries.professional_service_requests(professional_id).all()
         
         requests_list = []
         for req in service_requests:
@@ -712,8 +870,8 @@ class ProfessionalServiceRequests(Resource):
             return make_response(jsonify({"error": "No data provided"}), 400)
 
         # Get the current professional
-        professional = ServiceProfessional.query.filter_by(user_id=current_user.id).first()
-        if not professional:
+        professional_id = current_principal().professional_id
+        if not professional_id:
             return make_response(jsonify({"error": "Professional profile not found"}), 404)
 
         # Get the service request
@@ -722,7 +880,7 @@ class ProfessionalServiceRequests(Resource):
             return make_response(jsonify({"error": "Service request not found"}), 404)
 
         # Check if the service request is assigned to this professional
-        if service_request.professional_id != professional.id:
+        if service_request.professional_id != professional_id:
             return make_response(jsonify({"error": "This service request is not assigned to you"}), 403)
 
         # Handle status transitions for professional
@@ -762,7 +920,6 @@ class ProfessionalServiceRequests(Resource):
             service_request.remarks = data['remarks']
 
         db.session.commit()
-        cache.delete('ProfessionalServiceRequests.get')
         return make_response(jsonify({"message": "Service request updated successfully"}), 200)
 
 # Add a new endpoint for the professional profile
@@ -770,7 +927,8 @@ class ProfessionalProfile(Resource):
     @auth_required('token')
     @roles_accepted('professional')
     def get(self):
-        professional = ServiceProfessional.query.filter_by(user_id=current_user.id).first()
+        professional_id = current_principal().professional_id
+        professional = db.session.get(ServiceProfessional, professional_id) if professional_id else None
         if not professional:
             return make_response(jsonify({"error": "Professional profile not found"}), 404)
             
@@ -789,13 +947,14 @@ class ProfessionalProfile(Resource):
 class ServiceRequests(Resource):
     @auth_required('token')
     @roles_accepted('admin')
+    @conditional(lambda: [SERVICE_REQUESTS_TAG])
     def get(self, service_id):
         service = Service.query.get(service_id)
         if not service:
             return make_response(jsonify({"error": "Service not found"}), 404)
         
         # Get all service requests for this service
-        service_requests = ServiceRequest.query.filter_by(service_id=service_id).all()
+        service_requests = queries.requests_for_service(service_id).all()
         
         requests_list = []
         for req in service_requests:
@@ -820,10 +979,15 @@ class ServiceRequests(Resource):
 class AllServiceRequests(Resource):
     @auth_required('token')
     @roles_accepted('admin')
+    @conditional(lambda: [SERVICE_REQUESTS_TAG])
     def get(self):
+        # ?stream=ndjson sends one JSON object per line while reading in batches
+        if request.args.get('stream') == 'ndjson':
+            return self.stream_ndjson()
+
         try:
             # Fetch all service requests
-            service_requests = ServiceRequest.query.all()
+            service_requests = queries.all_service_requests().all()
             
             requests_list = []
             for req in service_requests:
@@ -854,3 +1018,39 @@ class AllServiceRequests(Resource):
             import traceback
             traceback.print_exc()
             return make_response(jsonify({"error": str(e)}), 500)
+
+    def stream_ndjson(self):
+        query = queries.all_service_requests_rows().yield_per(STREAM_BATCH_SIZE)
+
+        def generate():
+            for row in query:
+                yield current_app.json.dumps({
+                    "id": row.id,
+                    "service_id": row.service_id,
+                    "service_name": row.service_name if row.service_name is not None else "Unknown",
+                    "customer_id": row.customer_id,
+                    "customer_name": row.customer_name if row.customer_name is not None else "Unknown",
+                    "customer_email": row.customer_email,
+                    "professional_id": row.professional_id,
+                    "professional_name": row.professional_name,
+                    "professional_email": row.professional_email,
+                    "status": row.service_status.name,
+                    "price": row.price,
+                    "remarks": row.remarks,
+                    "date_of_request": row.date_of_request,
+                    "preferred_date": row.preferred_date
+                }) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# Readiness probe for load balancers and the gevent entry point
+class Readiness(Resource):
+    def get(self):
+        try:
+            db.session.execute(text("SELECT 1"))
+            cache.get('readiness')
+        except Exception as e:
+            print(f"Readiness check failed: {str(e)}")
+            return make_response(jsonify({"status": "unavailable"}), 503)
+        return make_response(jsonify({"status": "ready"}), 200)
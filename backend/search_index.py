@@ -0,0 +1,48 @@
+import re
+from sqlalchemy import text
+from models import db
+
+# SQLite FTS5 indexes for free-text search. Each index is an external-content
+# FTS5 table over its source table, kept in sync by triggers so every write
+# path (ORM, bulk statements, imports) updates it in the same transaction.
+
+def fts_ddl(index, source, columns):
+    """DDL for an external-content FTS5 index over source and its sync triggers."""
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{name}" for name in columns)
+    old_values = ", ".join(f"old.{name}" for name in columns)
+    delete_old = (f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old_values}); ")
+    insert_new = f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new_values}); "
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({names}, content='{source}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {source} BEGIN {insert_new}END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {source} BEGIN {delete_old}END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {names} ON {source} BEGIN "
+        f"{delete_old}{insert_new}END",
+    ]
+
+PROFESSIONAL_FTS_DDL = fts_ddl('professional_fts', 'service_professional', ['name', 'description'])
+SERVICE_FTS_DDL = fts_ddl('service_fts', 'service', ['name', 'description'])
+
+def fts_enabled():
+    """FTS5 tables only exist on SQLite; other databases fall back to ILIKE."""
+    return db.engine.dialect.name == 'sqlite'
+
+def create_fts_index(ddl, table):
+    """Create an FTS5 table with its triggers and index the existing rows."""
+    with db.engine.begin() as conn:
+        for statement in ddl:
+            conn.execute(text(statement))
+        conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+
+def create_professional_fts():
+    create_fts_index(PROFESSIONAL_FTS_DDL, 'professional_fts')
+
+def create_service_fts():
+    create_fts_index(SERVICE_FTS_DDL, 'service_fts')
+
+def match_expression(search, column=None):
+    """Turn user input into a safe FTS5 query: every word must match as a prefix."""
+    prefix = f"{column} : " if column else ""
+    terms = [f'{prefix}"{word}"*' for word in re.findall(r'\w+', search or '')]
+    return " ".join(terms) or None
@@ -0,0 +1,49 @@
+# Production entry point: python serve.py [--host HOST] [--port PORT]
+# Serves the app with gevent's WSGI server, one greenlet per request.
+# Patching has to happen before anything else imports socket, ssl or
+# threading, so redis-py, smtplib and the SQLAlchemy pool all yield while
+# they wait on I/O.
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import os
+import signal
+
+os.environ.setdefault('PROCESS_TYPE', 'web')
+
+def patch_database_driver():
+    """
+    psycopg2 needs a wait callback to yield to other greenlets. The sqlite3
+    driver cannot be patched; its calls are short and run on the hub.
+    """
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
+
+patch_database_driver()
+
+import gevent
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from app import create_app, create_admin
+
+def serve(app, host, port, max_connections):
+    create_admin(app)
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections))
+    # Stop accepting connections and let in-flight requests finish
+    gevent.signal_handler(signal.SIGTERM, server.stop)
+    print(f"Serving on http://{host}:{port} with gevent")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the API with gevent.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--max-connections', type=int, default=1000, help='Concurrent requests being served')
+    args = parser.parse_args()
+    # Built once up front so every request is served by the preloaded app
+    serve(create_app(), args.host, args.port, args.max_connections)
@@ -0,0 +1,55 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Cold-start check for web and worker processes using python -X importtime.
+# Each target runs in a fresh interpreter; the best of a few runs is compared
+# with its import budget so a heavy new top-level import fails the check.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (code run in a fresh interpreter, import budget in ms)
+STARTUP_TARGETS = {
+    'web': ("import app; app.create_app()", 1300),
+    'worker': ("import worker", 1200),
+}
+
+def measure(code):
+    """(total import ms, wall ms, [(cumulative ms, top-level module)]) for one cold run."""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; only top-level ones add up to the total
+        if not name.startswith('  '):
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sum(ms for ms, _ in modules), wall, sorted(modules, reverse=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure cold-start import time of the web and worker processes.')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per target; the fastest run counts')
+    parser.add_argument('--top', type=int, default=5, help='Slowest top-level imports to show')
+    args = parser.parse_args()
+
+    over_budget = []
+    for name, (code, budget) in STARTUP_TARGETS.items():
+        total, wall, modules = min((measure(code) for _ in range(args.runs)), key=lambda run: run[0])
+        print(f"{name}: imports {total:.0f}ms (budget {budget}ms), process {wall:.0f}ms")
+        for ms, module in modules[:args.top]:
+            print(f"    {ms:8.1f}ms  {module}")
+        if total > budget:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        raise SystemExit(1)
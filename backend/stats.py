@@ -0,0 +1,205 @@
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, func, inspect, delete, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+from models import db, ServiceRequest, ServiceRequestStats
+
+# Keeps the ServiceRequestStats rollup in step with ServiceRequest.
+# Every flush turns inserted, updated and deleted requests into per-key
+# deltas and upserts them in the same transaction, so the rollup commits
+# or rolls back together with the requests themselves.
+
+TRACKED_COLUMNS = ('customer_id', 'professional_id', 'service_id', 'service_status', 'date_of_request', 'price')
+KEY_COLUMNS = ('customer_id', 'professional_id', 'service_id', 'service_status', 'month')
+# Month key of requests without a date_of_request; sorts before every real month
+UNDATED_MONTH = '0000-00'
+
+def month_of(value):
+    return value.strftime('%Y-%m') if value else UNDATED_MONTH
+
+def stats_key(values):
+    return (values['customer_id'], values['professional_id'] or 0, values['service_id'],
+            values['service_status'], month_of(values['date_of_request']))
+
+def current_values(obj):
+    return {attr: getattr(obj, attr) for attr in TRACKED_COLUMNS}
+
+def previous_values(obj):
+    """
+    Column values as they were before this flush. The tracked columns use
+    active_history, so a changed column always has its old value in deleted.
+    """
+    state = inspect(obj)
+    values = {}
+    for attr in TRACKED_COLUMNS:
+        history = state.attrs[attr].history
+        values[attr] = history.deleted[0] if history.deleted else getattr(obj, attr)
+    return values
+
+def new_deltas():
+    return defaultdict(lambda: [0, 0.0])
+
+def add_delta(deltas, values, sign):
+    delta = deltas[stats_key(values)]
+    delta[0] += sign
+    delta[1] += sign * (values['price'] or 0)
+
+def collect_deltas(session):
+    deltas = new_deltas()
+
+    def apply(values, sign):
+        add_delta(deltas, values, sign)
+
+    for obj in session.new:
+        if isinstance(obj, ServiceRequest):
+            apply(current_values(obj), 1)
+    for obj in session.dirty:
+        if isinstance(obj, ServiceRequest):
+            state = inspect(obj)
+            if any(state.attrs[attr].history.has_changes() for attr in TRACKED_COLUMNS):
+                apply(previous_values(obj), -1)
+                apply(current_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, ServiceRequest):
+            apply(previous_values(obj), -1)
+
+    return {key: delta for key, delta in deltas.items() if delta != [0, 0.0]}
+
+def upsert_delta(session, key, count, price):
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    table = ServiceRequestStats.__table__
+    stmt = insert(table).values(dict(zip(KEY_COLUMNS, key), request_count=count, total_price=price))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            'request_count': table.c.request_count + stmt.excluded.request_count,
+            'total_price': table.c.total_price + stmt.excluded.total_price
+        }
+    )
+    session.execute(stmt)
+
+def after_flush(session, flush_context):
+    for key, (count, price) in collect_deltas(session).items():
+        upsert_delta(session, key, count, price)
+
+def record_bulk_changes(session, changes):
+    """
+    Rollup upkeep for ServiceRequest rows changed by bulk UPDATE statements,
+    which bypass flush events. changes is [(before, after)] dicts of TRACKED_COLUMNS.
+    """
+    deltas = new_deltas()
+    for before, after in changes:
+        add_delta(deltas, before, -1)
+        add_delta(deltas, after, 1)
+    for key, (count, price) in deltas.items():
+        if (count, price) != (0, 0.0):
+            upsert_delta(session, key, count, price)
+
+def register_stats_maintenance():
+    """Maintain the rollup on every SQLAlchemy session."""
+    if not event.contains(Session, 'after_flush', after_flush):
+        event.listen(Session, 'after_flush', after_flush)
+
+def expected_stats():
+    """The rollup recomputed from the raw ServiceRequest table."""
+    month = func.strftime('%Y-%m', ServiceRequest.date_of_request)
+    if db.engine.dialect.name == 'postgresql':
+        month = func.to_char(ServiceRequest.date_of_request, 'YYYY-MM')
+    # Same key as month_of for undated rows; the rollup's month is NOT NULL
+    month = func.coalesce(month, UNDATED_MONTH)
+    return db.session.query(
+        ServiceRequest.customer_id,
+        func.coalesce(ServiceRequest.professional_id, 0),
+        ServiceRequest.service_id,
+        ServiceRequest.service_status,
+        month,
+        func.count(ServiceRequest.id),
+        func.coalesce(func.sum(ServiceRequest.price), 0)
+    ).group_by(
+        ServiceRequest.customer_id,
+        func.coalesce(ServiceRequest.professional_id, 0),
+        ServiceRequest.service_id,
+        ServiceRequest.service_status,
+        month
+    )
+
+def rebuild_stats():
+    """Recompute the rollup from scratch in one transaction."""
+    db.session.execute(delete(ServiceRequestStats))
+    db.session.execute(ServiceRequestStats.__table__.insert().from_select(
+        list(KEY_COLUMNS) + ['request_count', 'total_price'],
+        expected_stats().statement
+    ))
+    db.session.commit()
+
+def check_stats():
+    """Compare the rollup with the raw table; returns a list of drifted keys."""
+    expected = {tuple(row[:5]): (row[5], round(row[6], 2)) for row in expected_stats()}
+    actual = {
+        (row.customer_id, row.professional_id, row.service_id, row.service_status, row.month):
+            (row.request_count, round(row.total_price, 2))
+        for row in ServiceRequestStats.query.filter(ServiceRequestStats.request_count != 0)
+    }
+    return [
+        (key, actual.get(key), expected.get(key))
+        for key in expected.keys() | actual.keys()
+        if actual.get(key) != expected.get(key)
+    ]
+
+# Reads
+
+def month_totals_by_customer(month, customer_ids=None):
+    """[(customer_id, total, closed)] for one month from the rollup."""
+    from models import ServiceStatusEnum
+    query = db.session.query(
+        ServiceRequestStats.customer_id,
+        func.sum(ServiceRequestStats.request_count),
+        func.sum(db.case((ServiceRequestStats.service_status == ServiceStatusEnum.CLOSED,
+                          ServiceRequestStats.request_count), else_=0))
+    ).filter(ServiceRequestStats.month == month)
+    if customer_ids is not None:
+        query = query.filter(ServiceRequestStats.customer_id.in_(customer_ids))
+    return query.group_by(ServiceRequestStats.customer_id).having(func.sum(ServiceRequestStats.request_count) > 0)
+
+def month_services_by_customer(month, customer_ids=None):
+    """[(customer_id, service_id, count)] for one month from the rollup."""
+    query = db.session.query(
+        ServiceRequestStats.customer_id,
+        ServiceRequestStats.service_id,
+        func.sum(ServiceRequestStats.request_count)
+    ).filter(ServiceRequestStats.month == month)
+    if customer_ids is not None:
+        query = query.filter(ServiceRequestStats.customer_id.in_(customer_ids))
+    return query.group_by(ServiceRequestStats.customer_id, ServiceRequestStats.service_id) \
+                .having(func.sum(ServiceRequestStats.request_count) > 0)
+
+def pending_counts_by_professional(statuses):
+    """[(professional_id, count)] of requests in the given statuses from the rollup."""
+    return db.session.query(
+        ServiceRequestStats.professional_id,
+        func.sum(ServiceRequestStats.request_count).label('pending_count')
+    ).filter(
+        ServiceRequestStats.professional_id != 0,
+        ServiceRequestStats.service_status.in_(statuses)
+    ).group_by(ServiceRequestStats.professional_id).having(func.sum(ServiceRequestStats.request_count) > 0)
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Rebuild or check the service request statistics rollup.')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute the rollup from the service_request table')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.rebuild:
+            rebuild_stats()
+            print("Statistics rebuilt")
+        drift = check_stats()
+        for key, actual, expected in drift:
+            print(f"Drift at {key}: rollup={actual} expected={expected}")
+        print(f"{len(drift)} drifted rows")
+        if drift:
+            raise SystemExit(1)
@@ -1,9 +1,12 @@
-from celery_instance import celery_app
-from mail_service import send_message
+from celery_instance import celery_app, flask_app
+from celery.schedules import crontab
+from mail_service import SMTPMailer, build_message
 from datetime import datetime, date, timedelta
+import os
+import time
 import smtplib
 from email.message import EmailMessage
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case
 from flask import render_template
 from celery import shared_task
 from models import Customer, ServiceRequest, Service, ServiceProfessional
@@ -15,18 +18,29 @@ SENDER_EMAIL = "23f2004759@ds.study.iitm.ac.in"
 SENDER_PASSWORD = ""
 
 
-@celery_app.task
-def create_resource_csv():
+# Closed-request exports are written here, one gzip file per task
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+# Number of rows fetched per round-trip while writing an export
+EXPORT_BATCH_SIZE = 1000
+
+
+@celery_app.task(bind=True)
+def create_resource_csv(self, status='CLOSED', start_date=None, end_date=None):
+    """
+    Export service requests with the given status to a gzip-compressed CSV.
+    start_date and end_date are optional ISO dates (inclusive) on date_of_request.
+    """
     # We'll use deferred imports to avoid circular dependencies
     from models import db, ServiceRequest, Customer, ServiceProfessional, Service, ServiceStatusEnum
-    from app import app
-    from io import StringIO
+    app = flask_app()
     import csv
+    import gzip
+    import uuid
     
     # Use Flask app context explicitly
     with app.app_context():
-        # Query to get service requests with status 'closed' and join with related tables
-        csv_data = db.session.query(
+        # Query to get service requests with the given status and join with related tables
+        query = db.session.query(
             ServiceRequest.id.label('id'),
             Customer.name.label('customer_name'),
             ServiceProfessional.name.label('professional_name'),
@@ -35,19 +49,25 @@ def create_resource_csv():
         ).join(Customer, ServiceRequest.customer_id == Customer.id) \
          .join(ServiceProfessional, ServiceRequest.professional_id == ServiceProfessional.id) \
          .join(Service, ServiceRequest.service_id == Service.id) \
-         .filter(ServiceRequest.service_status == ServiceStatusEnum.CLOSED).all()
+         .filter(ServiceRequest.service_status == ServiceStatusEnum[status])
+
+        if start_date:
+            query = query.filter(ServiceRequest.date_of_request >= datetime.fromisoformat(start_date))
+        if end_date:
+            query = query.filter(ServiceRequest.date_of_request < datetime.fromisoformat(end_date) + timedelta(days=1))
 
-        # Create a CSV string
-        si = StringIO()
-        cw = csv.writer(si)
-        cw.writerow(["ID", "Customer Name", "Professional Name", "Service Name", "Status"])
-        cw.writerows([(row.id, row.customer_name, row.professional_name, row.service_name, row.status.name) for row in csv_data])
-        output = si.getvalue()
+        # Each task writes its own file; the final name only appears once complete
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        file_path = os.path.join(EXPORT_DIR, f"service_requests_{self.request.id or uuid.uuid4()}.csv.gz")
+        partial_path = file_path + '.part'
 
-        # Save the CSV data to a file
-        file_path = 'closed_service_requests.csv'
-        with open(file_path, 'w', newline='') as f:
-            f.write(output)
+        # Stream rows from the database straight into the compressed file
+        with gzip.open(partial_path, 'wt', newline='') as f:
+            cw = csv.writer(f)
+            cw.writerow(["ID", "Customer Name", "Professional Name", "Service Name", "Status"])
+            for row in query.order_by(ServiceRequest.id).yield_per(EXPORT_BATCH_SIZE):
+                cw.writerow((row.id, row.customer_name, row.professional_name, row.service_name, row.status.name))
+        os.replace(partial_path, file_path)
 
         return file_path
 
@@ -68,98 +88,119 @@ def create_resource_csv():
         
 #         return "OK"
 
+# Number of reminder emails sent per SMTP connection
+REMINDER_BATCH_SIZE = 500
+
+
 @celery_app.task
 def daily_reminder():
     # Import inside the function to avoid circular imports
     from models import ServiceProfessional, ServiceRequest, ServiceStatusEnum
-    from mail_service import send_message
-    from sqlalchemy import or_
-    from app import app
+    from mail_service import send_messages
+    from stats import pending_counts_by_professional
+    app = flask_app()
 
     
     # Use Flask app context explicitly
     with app.app_context():
-        # Get all professionals, not just user_id 12
-        professionals = ServiceProfessional.query.all()
-        for professional in professionals:
-            # Find pending requests for this professional
-            pending_requests = ServiceRequest.query.filter(
-                ServiceRequest.professional_id == professional.id,
-                or_(
-                    ServiceRequest.service_status == ServiceStatusEnum.REQUESTED,
-                    ServiceRequest.service_status == ServiceStatusEnum.ACCEPTED
-                )
-            ).all()
-            
-            # Only send email if there are pending requests
-            if pending_requests:
-                to = professional.name 
-                subject = "Daily Reminder - New Service Requests"
-                message = (f"Hello {professional.name},\n\n"
-                          f"You have {len(pending_requests)} pending service requests. "
-                          f"Please login to your account to review them.\n\n"
-                          f"Thank you!")
-                
-                # Uncomment this line to actually send the email
-                send_message(to, subject, message)
-                
+        # One grouped query over the stats rollup returns only professionals that have pending requests
+        pending = pending_counts_by_professional([ServiceStatusEnum.REQUESTED, ServiceStatusEnum.ACCEPTED]).subquery()
+        pending_counts = db.session.query(
+            ServiceProfessional.name,
+            pending.c.pending_count
+        ).join(pending, pending.c.professional_id == ServiceProfessional.id) \
+         .yield_per(REMINDER_BATCH_SIZE)
 
+        batch = []
+        for professional in pending_counts:
+            to = professional.name 
+            subject = "Daily Reminder - New Service Requests"
+            message = (f"Hello {professional.name},\n\n"
+                      f"You have {professional.pending_count} pending service requests. "
+                      f"Please login to your account to review them.\n\n"
+                      f"Thank you!")
+            batch.append((to, subject, message))
+
+            if len(batch) >= REMINDER_BATCH_SIZE:
+                send_messages(batch)
+                batch = []
+
+        if batch:
+            send_messages(batch)
         
         return "Reminders sent successfully"
 
-@celery_app.task
-def monthly_report_generator():
+def monthly_customer_stats(month, customer_ids=None):
     """
-    Generate and send monthly activity reports to customers
-    Runs on the first day of each month
+    Every customer's totals and service distribution for a YYYY-MM month,
+    read from the ServiceRequestStats rollup. Returns {customer_id: stats}
+    for customers with activity; pass customer_ids to restrict it.
+    """
+    from stats import month_totals_by_customer, month_services_by_customer
+    from catalog import get_catalog
+    stats = {}
+
+    for customer_id, total, completed in month_totals_by_customer(month, customer_ids):
+        stats[customer_id] = {"total_requests": total, "completed_requests": completed or 0, "service_distribution": []}
+
+    services = get_catalog().by_id
+    for customer_id, service_id, count in month_services_by_customer(month, customer_ids):
+        service = services.get(service_id)
+        stats[customer_id]["service_distribution"].append((service["name"] if service else "Unknown", count))
+    for customer_stats in stats.values():
+        customer_stats["service_distribution"].sort()
+
+    return stats
+
+# Customers handled by one report task; chunks run in parallel across workers
+REPORT_CHUNK_SIZE = 200
+# Retries of a chunk that had failed sends; already delivered reports are skipped
+REPORT_CHUNK_MAX_RETRIES = 3
+# How long a "report delivered" marker is kept, well past any retry
+REPORT_SENT_MARKER_TIMEOUT = 40 * 24 * 60 * 60
+
+
+def report_sent_key(month_key, customer_id):
+    return f"monthly_report/{month_key}/sent/{customer_id}"
+
+@celery_app.task(bind=True, max_retries=REPORT_CHUNK_MAX_RETRIES)
+def send_monthly_report_chunk(self, customer_ids, month_start, now_date):
     """
-    from app import app  # Import here to avoid circular imports
+    Render and mail the monthly report of a chunk of customers.
+    month_start is the ISO date of the first day of the reporting month.
+    """
+    app = flask_app()
+    from caching import cache
     
     with app.app_context():
-        # Get current date information
-        now = datetime.now()
-        now_date = now.strftime("%d %B %Y")
+        month_start = datetime.fromisoformat(month_start)
+        month_key = month_start.strftime("%Y-%m")
+        current_month = month_start.strftime("%B")
         
-        # Calculate first and last day of previous month
-        first_day_prev_month = date(now.year, now.month, 1) - timedelta(days=1)
-        first_day_prev_month = date(first_day_prev_month.year, first_day_prev_month.month, 1)
-        last_day_prev_month = date(now.year, now.month, 1) - timedelta(days=1)
+        # Skip customers whose report already went out on an earlier attempt
+        sent_markers = cache.get_many(*[report_sent_key(month_key, customer_id) for customer_id in customer_ids])
+        pending_ids = [customer_id for customer_id, sent in zip(customer_ids, sent_markers) if not sent]
         
-        # Get month name for report
-        current_month = first_day_prev_month.strftime("%B")
-        
-        # Get all customers
-        customers = Customer.query.all()
+        monthly_stats = monthly_customer_stats(month_key, pending_ids)
+        no_activity = {"total_requests": 0, "completed_requests": 0, "service_distribution": []}
+        customers = Customer.query.filter(Customer.id.in_(pending_ids)).all() if pending_ids else []
         
+        sent = 0
+        failed = []
+        # Reuse one SMTP connection for every report in the chunk
+        mailer = SMTPMailer()
         for customer in customers:
             if not customer.name:
                 continue
                 
-            # Calculate customer specific stats
-            total_requests = ServiceRequest.query.filter(
-                ServiceRequest.customer_id == customer.id,
-            ).count()
-            
-            completed_requests = ServiceRequest.query.filter(
-                ServiceRequest.customer_id == customer.id,
-                ServiceRequest.service_status == 'CLOSED'
-            ).count()
-            
-            # Get service type distribution
-            service_distribution = db.session.query(
-                Service.name, func.count(ServiceRequest.id)
-            ).join(
-                ServiceRequest, ServiceRequest.service_id == Service.id
-            ).filter(
-                ServiceRequest.customer_id == customer.id,
-            ).group_by(Service.name).all()
+            stats = monthly_stats.get(customer.id, no_activity)
             
             # Create data dict for the template
             data = {
                 "customer_name": customer.name,
-                "total_requests": total_requests,
-                "completed_requests": completed_requests,
-                "service_distribution": service_distribution,
+                "total_requests": stats["total_requests"],
+                "completed_requests": stats["completed_requests"],
+                "service_distribution": stats["service_distribution"],
                 "current_month": current_month,
                 "now_date": now_date
             }
@@ -171,7 +212,181 @@ def monthly_report_generator():
             to = customer.name  # Dummy email for MailHog
             subject = f"{current_month} Monthly Activity Report - Household Services"
             # Send the rendered HTML report
-            send_message(to, subject, rendered_report)
-            print(f"Report sent to {to}")
-                
-        return {"message": f"{current_month} Monthly report sent successfully!"}
\ No newline at end of file
+            if mailer.send(build_message(to, subject, rendered_report)):
+                cache.set(report_sent_key(month_key, customer.id), True, timeout=REPORT_SENT_MARKER_TIMEOUT)
+                sent += 1
+            else:
+                failed.append(customer.id)
+        mailer.close()
+        
+        # Retry the chunk for the failures; the markers keep delivered reports from being resent
+        if failed and self.request.retries < self.max_retries:
+            raise self.retry(countdown=60 * 2 ** self.request.retries)
+        
+        return {
+            "customers": len(customer_ids),
+            "sent": sent,
+            "skipped": len(customer_ids) - len(pending_ids),
+            "failed": failed
+        }
+
+@celery_app.task
+def summarize_monthly_reports(chunk_results, current_month):
+    """Chord callback aggregating the outcome of every report chunk."""
+    summary = {
+        "message": f"{current_month} Monthly report sent successfully!",
+        "chunks": len(chunk_results),
+        "customers": sum(result["customers"] for result in chunk_results),
+        "sent": sum(result["sent"] for result in chunk_results),
+        "skipped": sum(result["skipped"] for result in chunk_results),
+        "failed": [customer_id for result in chunk_results for customer_id in result["failed"]]
+    }
+    if summary["failed"]:
+        summary["message"] = f"{current_month} Monthly report sent with {len(summary['failed'])} failures"
+    print(summary["message"])
+    return summary
+
+@celery_app.task
+def monthly_report_generator():
+    """
+    Generate and send monthly activity reports to customers
+    Runs on the first day of each month and fans the customers out in
+    chunks of REPORT_CHUNK_SIZE to run in parallel across workers
+    """
+    app = flask_app()
+    from celery import chord
+    
+    with app.app_context():
+        # Get current date information
+        now = datetime.now()
+        now_date = now.strftime("%d %B %Y")
+        
+        # Reporting window is the whole previous month
+        first_day_this_month = datetime(now.year, now.month, 1)
+        first_day_prev_month = (first_day_this_month - timedelta(days=1)).replace(day=1)
+        
+        # Get month name for report
+        current_month = first_day_prev_month.strftime("%B")
+        
+        customer_ids = [customer_id for (customer_id,) in db.session.query(Customer.id).order_by(Customer.id)]
+        if not customer_ids:
+            return {"message": f"{current_month} Monthly report: no customers", "chunks": 0}
+        
+        chunks = [customer_ids[i:i + REPORT_CHUNK_SIZE] for i in range(0, len(customer_ids), REPORT_CHUNK_SIZE)]
+        result = chord(
+            send_monthly_report_chunk.s(chunk, first_day_prev_month.isoformat(), now_date)
+            for chunk in chunks
+        )(summarize_monthly_reports.s(current_month))
+        
+        return {
+            "message": f"{current_month} Monthly report dispatched",
+            "chunks": len(chunks),
+            "customers": len(customer_ids),
+            "summary_task_id": result.id
+        }
+
+@celery_app.task
+def refresh_admin_analytics():
+    """Recompute the cached admin analytics in the background"""
+    app = flask_app()
+    from analytics import refresh_admin_analytics as refresh
+    
+    with app.app_context():
+        refresh()
+        return "Admin analytics refreshed"
+
+
+# Fallback sweep for requests whose assignment task was lost or found nobody free
+ASSIGNMENT_SWEEP_INTERVAL = 60
+
+@celery_app.task
+def auto_assign_requests(request_ids=None):
+    """Assign unassigned service requests to available professionals"""
+    app = flask_app()
+    from assignment import assign_pending_requests, assign_all_pending
+
+    with app.app_context():
+        if request_ids is None:
+            return {"assigned": assign_all_pending()}
+        assignments, _ = assign_pending_requests(request_ids=request_ids)
+        return {"assigned": len(assignments)}
+
+
+# Uploaded import files wait here until their task has read them
+IMPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imports')
+
+@celery_app.task(bind=True)
+def import_spreadsheet(self, kind, file_path):
+    """
+    Import services or professionals from an uploaded file, reporting progress
+    after every batch. The file is removed once the import ends.
+    """
+    app = flask_app()
+    from importer import IMPORTERS
+
+    def progress(report):
+        # Calling the task directly has no id to report against
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta=report)
+
+    try:
+        with app.app_context():
+            return IMPORTERS[kind](file_path, progress)
+    finally:
+        os.remove(file_path)
+
+# Seconds between sweeps of old export and upload files
+FILE_CLEANUP_INTERVAL = 60 * 60
+
+@celery_app.task
+def remove_expired_files():
+    """
+    Delete exports whose task result has expired, so GetCSV can no longer
+    serve them, and uploads whose import never ran.
+    """
+    expires = celery_app.conf.result_expires
+    max_age = expires.total_seconds() if isinstance(expires, timedelta) else expires
+    cutoff = time.time() - max_age
+    removed = 0
+    for directory in (EXPORT_DIR, IMPORT_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return {"removed": removed}
+
+
+@celery_app.on_after_configure.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        crontab(hour=0, minute=49, day_of_week='*'),
+        daily_reminder.s(),
+    )
+    
+    sender.add_periodic_task(
+        crontab(hour=0, minute=49),
+        monthly_report_generator.s(),
+    )
+    
+    # Keep the cached admin analytics warm
+    from analytics import ANALYTICS_REFRESH_INTERVAL
+    sender.add_periodic_task(
+        ANALYTICS_REFRESH_INTERVAL,
+        refresh_admin_analytics.s(),
+    )
+
+    # Pick up unassigned requests the per-request task missed
+    sender.add_periodic_task(
+        ASSIGNMENT_SWEEP_INTERVAL,
+        auto_assign_requests.s(),
+    )
+
+    sender.add_periodic_task(
+        FILE_CLEANUP_INTERVAL,
+        remove_expired_files.s(),
+    )
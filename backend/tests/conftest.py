@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'pw'
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    """A web app on its own SQLite file with an in-process cache and cheap password hashing."""
+    import config
+    path = tmp_path_factory.mktemp('db') / 'test.sqlite3'
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(config.localdev, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+        patch.setattr(config.localdev, 'CACHE_TYPE', 'SimpleCache')
+        patch.setattr(config.localdev, 'SECURITY_PASSWORD_HASH_PASSLIB_OPTIONS', {
+            'argon2__rounds': 1, 'argon2__memory_cost': 1024, 'argon2__parallelism': 1})
+        from app import create_app
+        app = create_app('web')
+
+    from models import db, user_datastore
+    from migrate import upgrade
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        for role in ('admin', 'professional', 'customer'):
+            user_datastore.create_role(name=role)
+        db.session.commit()
+    return app
+
+@pytest.fixture(scope='module')
+def client(app):
+    return app.test_client(use_cookies=False)
+
+def auth_headers(client, email):
+    response = client.post('/signin', json={'email': email, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {'Authorization': response.get_json()['user']['authentication_token']}
@@ -0,0 +1,24 @@
+from conftest import PASSWORD, auth_headers
+from models import User
+from importer import import_professionals
+
+def write_csv(path, rows):
+    lines = ['email,password,name,service_type,pincode'] + [
+        f'{email},{PASSWORD},{name},plumbing,600001' for email, name in rows
+    ]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+def test_imported_email_keeps_its_case(app, client, tmp_path):
+    file_path = write_csv(tmp_path / 'professionals.csv', [
+        ('John@Example.com', 'John'),
+        # Same mailbox in another case
+        ('john@example.com', 'Johnny')
+    ])
+    with app.app_context():
+        report = import_professionals(file_path)
+        assert report['created'] == 1
+        assert report['errors'] == [{'line': 3, 'error': 'User already exists'}]
+        assert User.query.filter_by(email='John@Example.com').count() == 1
+
+    auth_headers(client, 'John@Example.com')
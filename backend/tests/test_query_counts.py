@@ -0,0 +1,96 @@
+import pytest
+from flask_security.utils import hash_password
+from caching import cache
+from models import db, user_datastore, Admin, Customer, ServiceProfessional, Service, ServiceRequest, \
+    ServiceStatusEnum, ServiceTypeEnum
+from queries import count_queries
+from conftest import PASSWORD, auth_headers
+
+# The number of SQL statements per request must not grow with the data.
+# Every endpoint is called once with N rows and again with 10N rows.
+
+N = 5
+
+ENDPOINTS = [
+    ('customer', '/customer/dashboard'),
+    ('customer', '/customer/search-services?query=repair'),
+    ('customer', '/customer/search-services?pincode=600001'),
+    ('customer', '/admin/search-professionals?query=plumber'),
+    ('customer', '/admin/search-professionals?pincode=600001'),
+    ('customer', '/service/1/professionals?pincode=600001'),
+    ('professional', '/professional/requests'),
+    ('professional', '/professional/profile'),
+    ('admin', '/admin/dashboard'),
+    ('admin', '/admin/customers'),
+    ('admin', '/admin/professionals'),
+    ('admin', '/admin/service'),
+    ('admin', '/admin/service/1/requests'),
+    ('admin', '/admin/service-requests'),
+]
+
+def create_user(email, role, pincode=None):
+    user = user_datastore.create_user(email=email, password=hash_password(PASSWORD), pincode=pincode)
+    user_datastore.add_role_to_user(user, role)
+    db.session.flush()
+    return user
+
+def seed(start, count):
+    """Add count customers, professionals and services, and 4 * count requests."""
+    types = list(ServiceTypeEnum)
+    services = [Service(name=f'Repair {i}', price=100 + i, description='repair work', service_type=types[i % len(types)])
+                for i in range(start, start + count)]
+    customers = [Customer(user_id=create_user(f'customer{i}@abc.com', 'customer', f'6000{i % 10:02d}').id,
+                          name=f'Customer {i}') for i in range(start, start + count)]
+    professionals = [ServiceProfessional(
+        user_id=create_user(f'professional{i}@abc.com', 'professional', f'6000{i % 10:02d}').id,
+        name=f'Pro {i}', description='plumber', service_type=types[i % len(types)], approved=True
+    ) for i in range(start, start + count)]
+    db.session.add_all(services + customers + professionals)
+    db.session.flush()
+
+    first_customer = db.session.get(Customer, 1) or customers[0]
+    first_professional = db.session.get(ServiceProfessional, 1) or professionals[0]
+    first_service = db.session.get(Service, 1) or services[0]
+    statuses = list(ServiceStatusEnum)
+    for i in range(4 * count):
+        # Requests of the signed-in customer and professional, and of the first
+        # service, spread over the new rows so every list has more to join
+        db.session.add(ServiceRequest(
+            customer_id=first_customer.id if i % 2 else customers[i % count].id,
+            professional_id=professionals[i % count].id if i % 2 else first_professional.id,
+            service_id=first_service.id if i % 4 == 0 else services[i % count].id,
+            service_status=statuses[i % len(statuses)],
+            price=100
+        ))
+    db.session.commit()
+
+def query_counts(app, client, headers):
+    counts = {}
+    for role, url in ENDPOINTS:
+        with app.app_context():
+            # Cold caches, so both runs execute the same statements
+            cache.clear()
+            with count_queries() as counter:
+                response = client.get(url, headers=headers[role])
+        assert response.status_code == 200, (url, response.get_data(as_text=True))
+        counts[url] = counter['count']
+    return counts
+
+@pytest.fixture(scope='module')
+def headers(app, client):
+    with app.app_context():
+        admin = create_user('admin@abc.com', 'admin')
+        db.session.add(Admin(user_id=admin.id, name='Admin'))
+        seed(0, N)
+    return {role: auth_headers(client, email) for role, email in (
+        ('customer', 'customer0@abc.com'),
+        ('professional', 'professional0@abc.com'),
+        ('admin', 'admin@abc.com'),
+    )}
+
+def test_query_counts_do_not_grow_with_rows(app, client, headers):
+    small = query_counts(app, client, headers)
+    with app.app_context():
+        seed(N, 9 * N)
+    large = query_counts(app, client, headers)
+    assert large == small
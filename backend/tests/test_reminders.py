@@ -0,0 +1,56 @@
+import math
+import pytest
+import mail_service
+import tasks
+from models import db, user_datastore, Customer, ServiceProfessional, Service, ServiceRequest, \
+    ServiceStatusEnum, ServiceTypeEnum
+from queries import count_queries
+
+# The daily reminder must run a fixed number of statements and send one
+# batch per REMINDER_BATCH_SIZE professionals, however many there are.
+
+N = 5
+BATCH_SIZE = 4
+
+def seed(start, count):
+    """Add count professionals, each with one requested and one accepted request."""
+    user = user_datastore.create_user(email=f'reminder-customer{start}@abc.com', password='x')
+    db.session.flush()
+    customer = Customer(user_id=user.id, name='Customer')
+    service = Service(name='Tap repair', price=100, service_type=ServiceTypeEnum.PLUMBING)
+    professionals = []
+    for i in range(start, start + count):
+        user = user_datastore.create_user(email=f'reminder-pro{i}@abc.com', password='x')
+        db.session.flush()
+        professionals.append(ServiceProfessional(user_id=user.id, name=f'Pro {i}',
+                                                 service_type=ServiceTypeEnum.PLUMBING, approved=True))
+    db.session.add_all([customer, service, *professionals])
+    db.session.flush()
+    for professional in professionals:
+        for status in (ServiceStatusEnum.REQUESTED, ServiceStatusEnum.ACCEPTED):
+            db.session.add(ServiceRequest(customer_id=customer.id, service_id=service.id,
+                                          professional_id=professional.id, service_status=status, price=100))
+    db.session.commit()
+
+def run_reminders(app):
+    batches = []
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(tasks, 'REMINDER_BATCH_SIZE', BATCH_SIZE)
+        patch.setattr(mail_service, 'send_messages', lambda messages: batches.append(list(messages)))
+        with app.app_context(), count_queries() as counter:
+            tasks.daily_reminder()
+    return counter['count'], batches
+
+def test_reminder_statements_do_not_grow_with_professionals(app):
+    with app.app_context():
+        seed(0, N)
+    small_count, small_batches = run_reminders(app)
+    with app.app_context():
+        seed(N, 9 * N)
+    large_count, large_batches = run_reminders(app)
+
+    assert large_count == small_count
+    for batches, professionals in ((small_batches, N), (large_batches, 10 * N)):
+        assert len(batches) == math.ceil(professionals / BATCH_SIZE)
+        assert sum(len(batch) for batch in batches) == professionals
+        assert all('2 pending service requests' in message for batch in batches for _, _, message in batch)
@@ -0,0 +1,34 @@
+import pytest
+from flask_security.utils import hash_password
+from models import db, user_datastore, Customer, Service, ServiceTypeEnum
+from conftest import PASSWORD, auth_headers
+
+@pytest.fixture(scope='module')
+def customer_headers(app, client):
+    with app.app_context():
+        user = user_datastore.create_user(email='search-customer@abc.com', password=hash_password(PASSWORD))
+        user_datastore.add_role_to_user(user, 'customer')
+        db.session.flush()
+        db.session.add_all([
+            Customer(user_id=user.id, name='Customer'),
+            Service(name='Cheap fix', price=50, service_type=ServiceTypeEnum.PLUMBING),
+            Service(name='Dear fix', price=500, service_type=ServiceTypeEnum.PLUMBING)
+        ])
+        db.session.commit()
+    return auth_headers(client, 'search-customer@abc.com')
+
+@pytest.mark.parametrize('query, message', [
+    ('min_price=abc', 'min_price'),
+    ('max_price=nan', 'max_price'),
+    ('min_price=200&max_price=100', 'min_price'),
+    ('page=x', 'page')
+])
+def test_bad_search_parameters_are_rejected(client, customer_headers, query, message):
+    response = client.get(f'/customer/search-services?{query}', headers=customer_headers)
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+
+def test_price_range_filters_services(client, customer_headers):
+    response = client.get('/customer/search-services?min_price=100&max_price=1000', headers=customer_headers)
+    assert response.status_code == 200
+    assert [service['name'] for service in response.get_json()] == ['Dear fix']
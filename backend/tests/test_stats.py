@@ -0,0 +1,53 @@
+import pytest
+from models import db, user_datastore, Customer, ServiceProfessional, Service, ServiceRequest, \
+    ServiceStatusEnum, ServiceTypeEnum
+from stats import check_stats, rebuild_stats
+
+@pytest.fixture(scope='module')
+def rows(app):
+    with app.app_context():
+        user = user_datastore.create_user(email='stats-customer@abc.com', password='x')
+        db.session.flush()
+        customer = Customer(user_id=user.id, name='Customer')
+        professionals = []
+        for i in range(2):
+            user = user_datastore.create_user(email=f'stats-pro{i}@abc.com', password='x')
+            db.session.flush()
+            professionals.append(ServiceProfessional(user_id=user.id, name=f'Pro {i}',
+                                                     service_type=ServiceTypeEnum.PLUMBING, approved=True))
+        service = Service(name='Tap repair', price=100, service_type=ServiceTypeEnum.PLUMBING)
+        db.session.add_all([customer, service, *professionals])
+        db.session.commit()
+        return customer.id, [professional.id for professional in professionals], service.id
+
+def add_request(customer_id, service_id, **values):
+    request = ServiceRequest(customer_id=customer_id, service_id=service_id, price=100, **values)
+    db.session.add(request)
+    db.session.commit()
+    return request.id
+
+def test_change_on_expired_row_keeps_rollup_in_step(app, rows):
+    customer_id, professional_ids, service_id = rows
+    with app.app_context():
+        request_id = add_request(customer_id, service_id, professional_id=professional_ids[0])
+        request = db.session.get(ServiceRequest, request_id)
+        # Change columns without reading them first, so their old values were never loaded
+        db.session.expire(request)
+        request.service_status = ServiceStatusEnum.ACCEPTED
+        request.professional_id = professional_ids[1]
+        db.session.commit()
+        assert check_stats() == []
+
+def test_undated_requests_are_rolled_up(app, rows):
+    customer_id, professional_ids, service_id = rows
+    with app.app_context():
+        request_id = add_request(customer_id, service_id, date_of_request=None)
+        assert check_stats() == []
+        rebuild_stats()
+        assert check_stats() == []
+
+        request = db.session.get(ServiceRequest, request_id)
+        db.session.expire(request)
+        request.service_status = ServiceStatusEnum.CANCELLED
+        db.session.commit()
+        assert check_stats() == []
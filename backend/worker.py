@@ -1,7 +1,17 @@
-from celery import Celery, Task
+# Celery worker bootstrap: celery -A worker.celery_app worker --beat
+# Builds a Flask app with just the config, database, cache and templates the
+# tasks need, without Flask-Security, CORS, Flask-RESTful or the routes.
+from flask import Flask
+from celery_instance import celery_app
+# Registers the tasks and the beat schedule before Celery is configured
+import tasks  # noqa: F401
 
+def create_worker_app(process_type='worker'):
+    from app import configure_app
 
-def celery_init_app(app):
-    celery_app = Celery(app.name)
-    celery_app.config_from_object("celery_config")
-    return celery_app
\ No newline at end of file
+    # Named after this module so templates/ resolves next to it
+    app = Flask(__name__)
+    configure_app(app, process_type)
+    return app
+
+app = create_worker_app()